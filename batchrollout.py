@@ -0,0 +1,76 @@
+"""
+Vectorized uniform random rollouts for reverse hex.
+Many playouts from the same position are simulated at once by filling stacked
+copies of the board with random permutations of the empty cells, the winners
+of all the filled boards are then found together with numpy.
+"""
+import numpy as np
+from gamestate import Gamestate
+
+class Batchrollout:
+  """
+  Simulates a batch of uniform random playouts from one position. Each playout
+  fills the whole board, which gives the same outcome distribution as playing
+  until the first connection (see Gamestate.filled_winner).
+  """
+
+  def __init__(self, num_rollouts, seed=None):
+    """
+    Initialize the engine to simulate num_rollouts playouts per call with its
+    own random generator.
+    """
+    self.num_rollouts = num_rollouts
+    self.rng = np.random.default_rng(seed)
+
+  def random_boards(self, state):
+    """
+    Return a (num_rollouts, size * size) int8 array of boards, each one the
+    passed state with its empty cells filled in an independent random order
+    by alternating stones starting with the player to move.
+    """
+    board = np.frombuffer(bytes(state.board), dtype=np.int8)
+    empty = np.flatnonzero(board == Gamestate.PLAYERS["none"])
+    order = np.argsort(self.rng.random((self.num_rollouts, len(empty))),
+                       axis=1)
+    colors = np.full(len(empty), Gamestate.OPPONENT[state.turn()],
+                     dtype=np.int8)
+    colors[0::2] = state.turn()
+
+    boards = np.tile(board, (self.num_rollouts, 1))
+    rows = np.arange(self.num_rollouts)[:, None]
+    boards[rows, empty[order]] = colors
+    return boards
+
+  def winners(self, boards, size):
+    """
+    Return the winner of each filled board. White's stones connected to its
+    first edge are grown one neighbor step at a time on all boards at once
+    until nothing changes, the boards where they reach the far edge are lost
+    by white.
+    """
+    count = len(boards)
+    white = np.zeros((count, size + 2, size + 2), dtype=bool)
+    white[:, 1:-1, 1:-1] = (boards.reshape(count, size, size) ==
+                            Gamestate.PLAYERS["white"])
+    reach = np.zeros_like(white)
+    reach[:, 1, :] = white[:, 1, :]
+
+    while True:
+      grown = (reach[:, 1:-1, 1:-1] | reach[:, :-2, 1:-1] |
+               reach[:, 1:-1, :-2] | reach[:, :-2, 2:] | reach[:, 1:-1, 2:] |
+               reach[:, 2:, 1:-1] | reach[:, 2:, :-2])
+      grown &= white[:, 1:-1, 1:-1]
+      if np.array_equal(grown, reach[:, 1:-1, 1:-1]):
+        break
+      reach[:, 1:-1, 1:-1] = grown
+
+    return np.where(reach[:, size, 1:-1].any(axis=1),
+                    Gamestate.PLAYERS["black"], Gamestate.PLAYERS["white"])
+
+  def roll_out(self, state):
+    """
+    Simulate num_rollouts random games from the passed state, return the
+    winners and the filled boards.
+    """
+    boards = self.random_boards(state)
+    return self.winners(boards, state.size), boards
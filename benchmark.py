@@ -0,0 +1,186 @@
+"""
+Micro benchmarks for the reverse hex players
+usage: python benchmark.py [name ...]
+"""
+
+import random
+import sys
+import time
+from gamestate import Gamestate
+from rave_mctsagent import RaveMctsagent
+from pattern_mctsagent import PatternMctsagent
+
+def best_time(function, repeat=5):
+  """Return the fastest of repeat timings of function in seconds."""
+  best = float('inf')
+  for i in range(repeat):
+    start = time.perf_counter()
+    function()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def random_positions(size, count, fill=0.5, seed=0):
+  """Return count random positions with the fraction fill of cells played."""
+  rng = random.Random(seed)
+  positions = []
+  for i in range(count):
+    state = Gamestate(size)
+    cells = state.moves()
+    rng.shuffle(cells)
+    for cell in cells[:int(fill * size * size)]:
+      state.play(cell)
+    positions.append(state)
+  return positions
+
+def bench_place(sizes=(9, 11, 13), games=50):
+  """Time filling empty boards with alternating place_white/place_black."""
+  for size in sizes:
+    rng = random.Random(size)
+    orders = []
+    for i in range(games):
+      cells = [(x, y) for x in range(size) for y in range(size)]
+      rng.shuffle(cells)
+      orders.append(cells)
+
+    def run():
+      for cells in orders:
+        state = Gamestate(size)
+        for cell in cells[0::2]:
+          state.place_white(cell)
+        for cell in cells[1::2]:
+          state.place_black(cell)
+
+    elapsed = best_time(run)
+    print("place    %2dx%-2d %6.2f us per stone" %
+          (size, size, elapsed / (games * size * size) * 1e6))
+
+def bench_reachable(sizes=(9, 11, 13), count=50):
+  """Time reachable from both edges through empty and own cells."""
+  for size in sizes:
+    positions = random_positions(size, count)
+
+    def run():
+      for state in positions:
+        for color in (Gamestate.PLAYERS["white"], Gamestate.PLAYERS["black"]):
+          colors = [color, Gamestate.PLAYERS["none"]]
+          state.reachable(colors, set(), Gamestate.EDGE1)
+          state.reachable(colors, set(), Gamestate.EDGE2)
+
+    elapsed = best_time(run)
+    print("reachable %2dx%-2d %6.1f us per call" %
+          (size, size, elapsed / (count * 4) * 1e6))
+
+def bench_dead(sizes=(9, 11, 13), count=50):
+  """
+  Time finding the dead cells of a position by local patterns, which the
+  dead cell agent does for every node it expands below the root.
+  """
+  for size in sizes:
+    positions = random_positions(size, count)
+
+    def run():
+      for state in positions:
+        state.dead_cells()
+
+    elapsed = best_time(run)
+    found = sum(len(state.dead_cells()) for state in positions) / count
+    print("dead     %2dx%-2d %6.1f us per call (%.1f dead cells)" %
+          (size, size, elapsed / count * 1e6, found))
+
+def bench_threads(size=11, threads=(1, 2, 4, 8, 16), seconds=5,
+                  batch_sizes=(1, 64)):
+  """
+  Measure rollouts per second of tree parallel search for each number of
+  threads, with the agent's own rollouts and with batched numpy rollouts.
+  """
+  for batch_size in batch_sizes:
+    for count in threads:
+      agent = RaveMctsagent(Gamestate(size))
+      agent.THREADS = count
+      agent.BATCH_SIZE = batch_size
+      agent.EARLY_STOP = False
+      start = time.perf_counter()
+      agent.search(seconds)
+      elapsed = time.perf_counter() - start
+      print("threads  %2dx%-2d batch %2d %2d threads %7.0f rollouts/sec" %
+            (size, size, batch_size, count, agent.root.N / elapsed))
+
+def bench_backup(sizes=(9, 13), playouts=2000):
+  """
+  Time backing up playouts on their own, replaying the paths and rollouts
+  of a search of as many fill rollouts into its tree.
+  """
+  for size in sizes:
+    random.seed(size)
+    agent = RaveMctsagent(Gamestate(size))
+    agent.FILL_ROLLOUTS = True
+    snapshot = agent.rootstate.snapshot()
+    samples = []
+    for i in range(playouts):
+      path, state = agent.select_node()
+      turn = state.turn()
+      result = agent.roll_out(state)
+      agent.backup(path, turn, *result)
+      state.restore(snapshot)
+      samples.append((path, turn, result))
+
+    def run():
+      for path, turn, result in samples:
+        agent.backup(path, turn, *result)
+
+    elapsed = best_time(run)
+    depth = sum(len(path) for path, turn, result in samples) / playouts
+    print("backup   %2dx%-2d %6.1f us per playout (depth %.2f)" %
+          (size, size, elapsed / playouts * 1e6, depth))
+
+def bench_policy(sizes=(9, 11, 13), seconds=5):
+  """
+  Measure rollouts per second of the uniform random rollouts of the basic
+  agent and of the pattern rollout policy.
+  """
+  for size in sizes:
+    for agent_class in (RaveMctsagent, PatternMctsagent):
+      agent = agent_class(Gamestate(size))
+      agent.EARLY_STOP = False
+      agent.search(seconds)
+      print("policy   %2dx%-2d %-16s %7.0f rollouts/sec" %
+            (size, size, agent_class.__name__, agent.root.N / seconds))
+
+def bench_match(size=9, games=20, seconds=0.5):
+  """
+  Play games of the pattern rollout policy against the basic agent with
+  seconds of search per move, each taking the first move in every other
+  game, and report how many the pattern policy won.
+  """
+  wins = 0
+  for game in range(games):
+    random.seed(game)
+    state = Gamestate(size)
+    pattern = PatternMctsagent(state)
+    basic = RaveMctsagent(state)
+    if game % 2 == 0:
+      players = (pattern, basic)
+      pattern_color = state.turn()
+    else:
+      players = (basic, pattern)
+      pattern_color = Gamestate.OPPONENT[state.turn()]
+    while state.winner() == Gamestate.PLAYERS["none"]:
+      player = players[state.num_played % 2]
+      player.search(seconds)
+      move = player.best_move()
+      state.play(move)
+      pattern.move(move)
+      basic.move(move)
+    wins += state.winner() == pattern_color
+  print("match    %2dx%-2d pattern won %d of %d games against basic" %
+        (size, size, wins, games))
+
+BENCHMARKS = {"place": bench_place, "reachable": bench_reachable,
+              "dead": bench_dead,
+              "threads": bench_threads, "backup": bench_backup,
+              "policy": bench_policy, "match": bench_match}
+
+if __name__ == "__main__":
+  names = sys.argv[1:] or list(BENCHMARKS.keys())
+  for name in names:
+    BENCHMARKS[name]()
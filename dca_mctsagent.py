@@ -8,96 +8,210 @@ by benzene: https://github.com/jakubpawlewicz/benzene
 
 from rave_mctsagent import *
 
+
+class Stonegroup:
+  """
+  Connected group of stones of one color as found by the union find
+  structure of its color, so every group touching an edge of that color is
+  a single group. Stores the number of stones, the empty cells next to them
+  and the cells reachable from the edges in the last dead cell analysis of
+  the group, None if it has to be analyzed again. Cells are kept as bit
+  masks over cell ids (see Boardtables.flood).
+  """
+
+  def __init__(self, color):
+    self.color = color
+    self.size = 0
+    self.liberties = 0
+    self.reach = None
+
+
 class DCAMctsagent(RaveMctsagent):
-  
+
   RAVE_CONSTANT = 300
+  # number of positions whose dead cells are remembered by their hash, the
+  # oldest is dropped when it is exceeded
+  DEAD_CACHE_SIZE = 10000
+  # nodes below the root only get a child for a single one of their dead
+  # cells, found by local patterns (see Gamestate.dead_cells) or at the root
+  PRUNE_DEAD = True
+
+  def __init__(self, state=Gamestate(8), workers=1):
+    self.dead_cache = {}
+    super().__init__(state, workers)
 
-  def __init__(self, state=Gamestate(8)):
-    super().__init__(state)
+  def set_gamestate(self, state):
+    """
+    Set the rootstate of the tree to the passed gamestate as RaveMctsagent
+    does, then forget the dead cells found so far and build the groups of
+    stones of the new position.
+    """
+    super().set_gamestate(state)
     self.dead = set()
+    self.groups = {}
+    board = self.rootstate.board
+    empty = self.rootstate.color_mask((Gamestate.PLAYERS["none"],))
+    neighbor_masks = self.rootstate.tables.neighbor_masks
+    for index in range(len(board)):
+      if board[index] != Gamestate.PLAYERS["none"]:
+        group = self.groups.setdefault(self.group_key(index, board[index]),
+                                       Stonegroup(board[index]))
+        group.size += 1
+        group.liberties |= neighbor_masks[index] & empty
+
+  def group_key(self, index, color):
+    """
+    Return the key of the group of the color holding the element index of
+    the union find structures, a cell id or an edge.
+    """
+    if color == Gamestate.PLAYERS["white"]:
+      return (color, self.rootstate.white_groups.find(index))
+    return (color, self.rootstate.black_groups.find(index))
+
+  def touched_edges(self, cell, color):
+    """Return the union find elements of the edges of color cell is on."""
+    state = self.rootstate
+    coordinate = cell[0] if color == Gamestate.PLAYERS["white"] else cell[1]
+    edges = []
+    if coordinate == 0:
+      edges.append(state.edge1)
+    if coordinate == state.size - 1:
+      edges.append(state.edge2)
+    return edges
 
   def special_case(self, last_move):
     """Return a move found without search, None otherwise."""
     size = self.rootstate.size
     moves = self.rootstate.moves()
-      
+
     if size < 6:
       move = self.get_small_board_move(last_move, size, moves)
       if move is not None:
         return move
-    
+
     move = self.get_starting_move(last_move, size, moves)
     if move is not None:
       return move
-      
+
     self.findDeadRegions()
     if len(self.dead) > 0:
       move = self.dead.pop()
       return move
-    
+
     return None
-  
+
   def move(self, move):
     """
     Make the passed move and update the tree approriately.
+    The group of the new stone replaces the groups it joins and the groups of
+    the other color it takes a liberty or a reachable cell from have to be
+    analyzed again.
     """
     self.dead.discard(move)
+    state = self.rootstate
+    color = state.turn()
+    index = move[0] * state.size + move[1]
+    joined = {self.group_key(nb, color)
+              for nb in state.tables.neighbor_ids[index]
+              if state.board[nb] == color}
+    joined.update(self.group_key(edge, color)
+                  for edge in self.touched_edges(move, color))
     super().move(move)
-  
-  def findEdgeUnreachable(self, color, stopset,
+
+    bit = 1 << index
+    group = Stonegroup(color)
+    group.size = 1
+    group.liberties = (state.tables.neighbor_masks[index] &
+                       state.color_mask((Gamestate.PLAYERS["none"],)))
+    for key in joined:
+      old = self.groups.pop(key, None)
+      if old is not None:
+        group.size += old.size
+        group.liberties |= old.liberties & ~bit
+    self.groups[self.group_key(index, color)] = group
+
+    for other in self.groups.values():
+      if other.color != color:
+        if other.liberties & bit:
+          other.liberties &= ~bit
+          other.reach = None
+        elif other.reach is not None and other.reach & bit:
+          other.reach = None
+
+  def child_moves(self, node, state):
+    """
+    Return a list of the cell ids of the moves node, whose position is
+    state, gets children for. Every dead cell leads to the same position up
+    to the color of dead cells, so with PRUNE_DEAD only the first of them is
+    kept below the root. The dead cells found at the root by
+    findDeadRegions stay dead below it. A root expanded as such keeps every
+    move, but the root promoted by move was expanded below it and may have
+    been pruned, so the solver compares against the number of moves each
+    node was expanded with (see Nodestore).
+    """
+    moves = list(state.empty)
+    if node == 0 or not self.PRUNE_DEAD:
+      return moves
+    dead = set(state.dead_cells().tolist())
+    size = state.size
+    dead.update(x * size + y for x, y in self.dead
+                if state.board[x * size + y] == Gamestate.PLAYERS["none"])
+    if len(dead) < 2:
+      return moves
+    kept = min(dead)
+    return [move for move in moves if move not in dead or move == kept]
+
+  def findEdgeUnreachable(self, color, stopset, passable, empty,
                           checkSide1=True, checkSide2=True):
     """
     Finds areas unreachable from either side of the board by crossing only empty
     or color cells and without crossing cells in the stopset. The calculation is
     skipped for a side if the stopset touches it, indicated by checkSide1 and
-    checkSide2. 
+    checkSide2.
+    Cells are given as bit masks over cell ids, passable holding the empty and
+    color cells and empty the empty ones. The unreachable cell ids are
+    returned along with the mask of the reachable cells.
     """
-    colors = [color, Gamestate.PLAYERS["none"]]
+    tables = self.rootstate.tables
+    seed = 0
     if checkSide1:
-      reachable1 = self.rootstate.reachable(colors, stopset, Gamestate.EDGE1)
-    else:
-      reachable1 = set()
+      seed |= tables.edge_masks[color][0]
     if checkSide2:
-      reachable2 = self.rootstate.reachable(colors, stopset, Gamestate.EDGE2)
-    else:
-      reachable2 = set()
-    
-    return self.rootstate.get_empty_cell_set() - (reachable1 | reachable2)
+      seed |= tables.edge_masks[color][1]
+    reach = tables.flood(seed & passable, passable, stopset)
+    return tables.mask_ids(empty & ~reach), reach
 
   def findDeadRegions(self):
     """
     Finds dead cells created by a single connected group of stones' neighbors
     and adds them to self.dead.
-    """    
-    color_groups = [self.rootstate.get_black_groups(),
-                    self.rootstate.get_white_groups()]
-    for groups in color_groups:
-      for key in groups.keys():
-        group = groups[key]
-        if len(group) < 2:
-          continue
-        color = self.rootstate.get_color(group[0])
-        nb = set()
-        
-        for cell in group:
-          for neighbor in self.rootstate.neighbors(cell):
-            if self.rootstate.get_color(neighbor) == Gamestate.PLAYERS["none"]:
-              nb.add(neighbor)
-        
-        checkSide1 = True
-        checkSide2 = True
-        if color == Gamestate.PLAYERS["black"]:
-          for cell in group:
-            if cell[1] == 0:
-              checkSide1 = False
-            elif cell[1] == self.rootstate.size - 1:
-              checkSide2 = False
-        elif color == Gamestate.PLAYERS["white"]:
-          for cell in group:
-            if cell[0] == 0:
-              checkSide1 = False
-            elif cell[0] == self.rootstate.size - 1:
-              checkSide2 = False
-              
-        self.dead = self.dead | self.findEdgeUnreachable(color, nb, checkSide1,
-                                                               checkSide2)
\ No newline at end of file
+    Only the groups changed since their last analysis are searched again,
+    the others cannot find anything new. The dead cells of a position are
+    remembered by its hash.
+    """
+    state = self.rootstate
+    cached = self.dead_cache.get(state.hash)
+    if cached is not None:
+      self.dead |= cached
+      return
+
+    cells = state.tables.cells
+    empty = state.color_mask((Gamestate.PLAYERS["none"],))
+    passable = {color: empty | state.color_mask((color,))
+                for color in (Gamestate.PLAYERS["white"],
+                              Gamestate.PLAYERS["black"])}
+    for (color, rep), group in self.groups.items():
+      if group.size < 2 or group.reach is not None:
+        continue
+      groups = (state.white_groups if color == Gamestate.PLAYERS["white"]
+                else state.black_groups)
+      checkSide1 = groups.find(state.edge1) != rep
+      checkSide2 = groups.find(state.edge2) != rep
+      dead, group.reach = self.findEdgeUnreachable(color, group.liberties,
+                                                   passable[color], empty,
+                                                   checkSide1, checkSide2)
+      self.dead.update(cells[index] for index in dead)
+
+    if len(self.dead_cache) >= self.DEAD_CACHE_SIZE:
+      del self.dead_cache[next(iter(self.dead_cache))]
+    self.dead_cache[state.hash] = frozenset(self.dead)
@@ -8,8 +8,8 @@ from rave_mctsagent import *
 
 class DecisiveMoveMctsagent(RaveMctsagent):
   
-  def __init__(self, state=Gamestate(8)):
-    super().__init__(state)
+  def __init__(self, state=Gamestate(8), workers=1):
+    super().__init__(state, workers)
   
   def special_case(self, last_move):
     """Return a move found without search, None otherwise."""
@@ -29,40 +29,26 @@ class DecisiveMoveMctsagent(RaveMctsagent):
     Simulate a random game except that we play all known critical cells
     first, return the winning player and record critical cells at the end.
     """
-    moves = state.moves()
-    good_moves = moves.copy()
-    good_opponent_moves = moves.copy()
+    cells = state.tables.cells
+    good_moves = state.empty.copy()
+    good_opponent_moves = state.empty.copy()
     to_play = state.turn()
     
     while(state.winner() == Gamestate.PLAYERS["none"]):
       done = False
       while len(good_moves) > 0 and not done:
-        move = random.choice(good_moves)
-        good_moves.remove(move)
-        if not state.would_lose(move, to_play):
-          state.play(move)
-          moves.remove(move)
-          if move in good_opponent_moves:
-            good_opponent_moves.remove(move)
+        index = good_moves.choice()
+        good_moves.remove(index)
+        if not state.would_lose(cells[index], to_play):
+          state.play(cells[index])
+          good_opponent_moves.discard(index)
           done = True
       
       if not done:    
-        move = random.choice(moves)
+        move = state.random_move()
         state.play(move)
-        moves.remove(move)
-        if move in good_opponent_moves:
-          good_opponent_moves.remove(move)
+        good_opponent_moves.discard(move[0] * state.size + move[1])
           
       good_moves, good_opponent_moves = good_opponent_moves, good_moves
     
-    black_rave_pts = []
-    white_rave_pts = []
-
-    for x in range(state.size):
-      for y in range(state.size):
-        if state.board[(x,y)] == Gamestate.PLAYERS["black"]:
-          black_rave_pts.append((x,y))
-        elif state.board[(x,y)] == Gamestate.PLAYERS["white"]:
-          white_rave_pts.append((x,y))
-
-    return state.winner(), black_rave_pts, white_rave_pts
\ No newline at end of file
+    return state.winner(), cell_owners(state)
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Exact solver for reverse hex positions with few empty cells left.
+The game is searched to the end depth first with alpha-beta pruning and a
+transposition table, instead of sampled with rollouts.
+"""
+import time
+
+class Solvertimeout(Exception):
+  """Raised from inside the search when the time budget runs out."""
+
+
+class Endgamesolver:
+  """
+  Alpha-beta search of a position to the end of the game. Scores are from
+  the point of view of the player to move: a position won with e empty cells
+  left at the end is worth e + 1 and a lost one -(e + 1), so among winning
+  moves the quickest scores highest and among losing ones the move holding
+  out the longest.
+  Positions are stored in a transposition table keyed by their zobrist hash
+  with a bound on their score and their best move, which is tried first when
+  the position is reached again. The other moves are tried by decreasing
+  priority. A move connecting the player's own edges loses at once (see
+  Gamestate.would_lose) so it is scored without being searched.
+  """
+  EXACT = 0
+  LOWER = 1
+  UPPER = 2
+  # number of positions searched between checks of the clock
+  CHECK_INTERVAL = 512
+
+  def __init__(self, state, priority):
+    """
+    Initialize the solver for a copy of the passed state, which must not be
+    over, with priority a sequence of move ordering values over cell ids.
+    """
+    self.state = state.clone()
+    self.priority = priority
+    self.table = {}
+    self.nodes = 0
+    self.deadline = None
+
+  def solve(self, time_budget):
+    """
+    Return the best move of the position as a cell along with its score, or
+    None if it could not be found within time_budget seconds. A winning move
+    is looked for first with a null window, only a lost position is searched
+    again for the move resisting longest.
+    """
+    self.deadline = time.perf_counter() + time_budget
+    bound = len(self.state.empty) + 1
+    try:
+      score = self.search(0, 1)
+      if score <= 0:
+        score = self.search(-bound, 1)
+    except Solvertimeout:
+      return None
+    move = self.table[self.state.hash][2]
+    return self.state.tables.cells[move], score
+
+  def search(self, alpha, beta):
+    """
+    Return the score of the position if it lies strictly between alpha and
+    beta, otherwise a bound on it beyond the one it falls outside of.
+    """
+    state = self.state
+    key = state.hash
+    entry = self.table.get(key)
+    first = -1
+    if entry is not None:
+      score, flag, first = entry
+      if (flag == self.EXACT or (flag == self.LOWER and score >= beta) or
+          (flag == self.UPPER and score <= alpha)):
+        return score
+
+    self.nodes += 1
+    if (self.nodes % self.CHECK_INTERVAL == 0 and
+        time.perf_counter() > self.deadline):
+      raise Solvertimeout()
+
+    cells = state.tables.cells
+    turn = state.turn()
+    moves = sorted(state.empty, key=self.priority.__getitem__, reverse=True)
+    if first >= 0:
+      moves.remove(first)
+      moves.insert(0, first)
+
+    #with nothing better every move loses at once, leaving one cell less
+    best_score = -len(moves)
+    best_move = moves[0]
+    start_alpha = alpha
+    for move in moves:
+      if state.would_lose(cells[move], turn):
+        continue
+      state.play(cells[move])
+      score = -self.search(-beta, -alpha)
+      state.undo()
+      if score > best_score:
+        best_score = score
+        best_move = move
+        if score > alpha:
+          alpha = score
+          if alpha >= beta:
+            break
+
+    if best_score <= start_alpha:
+      flag = self.UPPER
+    elif best_score >= beta:
+      flag = self.LOWER
+    else:
+      flag = self.EXACT
+    self.table[key] = (best_score, flag, best_move)
+    return best_score
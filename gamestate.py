@@ -1,6 +1,8 @@
-import numpy as np
 from unionfind import Unionfind
-from collections import deque
+from indexset import Indexset
+from array import array
+import random
+import numpy as np
 
 class Gamestate:
   """
@@ -26,31 +28,78 @@ class Gamestate:
     
 
   neighbor_patterns = ((-1,0), (0,-1), (-1,1), (0,1), (1,0), (1,-1))
+  # the same offsets in order around a cell, each next to the one before
+  ring_patterns = ((-1,0), (-1,1), (0,1), (1,0), (1,-1), (0,-1))
 
   def __init__(self, size):
     """
     Initialize the game board and give white first turn.
     Also create our union find structures for win checking.
+    The board is stored as a flat bytearray indexed by x * size + y so that
+    cloning the state only copies a few small buffers.
     """
     self.size = size
+    self.tables = get_tables(size)
     self.toplay = self.PLAYERS["white"]
-    self.board = np.zeros((size, size))
-    self.revealed = np.zeros((size, size))
-    self.white_groups = Unionfind()
-    self.black_groups = Unionfind()
-    self.white_groups.set_ignored_elements([self.EDGE1, self.EDGE2])
-    self.black_groups.set_ignored_elements([self.EDGE1, self.EDGE2])
+    self.board = bytearray(size * size)
+    self.revealed = bytearray(size * size)
+    # the edges are represented in the union find structures by the two
+    # elements following the cells
+    self.edge1 = size * size
+    self.edge2 = size * size + 1
+    self.white_groups = Unionfind(size * size + 2)
+    self.black_groups = Unionfind(size * size + 2)
+    self.white_groups.set_ignored_elements([self.edge1, self.edge2])
+    self.black_groups.set_ignored_elements([self.edge1, self.edge2])
     self.num_played = 0
-    self.empty = set()
-    for i in range(self.size):
-      for j in range(self.size):
-        self.empty.add((i, j))
+    # zobrist hash of the stones on the board and the player to move
+    self.hash = 0
+    self.trail = []
+    # indices x * size + y of the empty cells
+    self.empty = Indexset(size * size)
+    # base 3 code of the colors around every cell (see Boardtables) with the
+    # stones of the first ring_mark entries of the trail
+    self.rings = self.tables.edge_rings[:]
+    self.ring_mark = 0
         
+  def clone(self):
+    """
+    Return an independent copy of this state. Much cheaper than deepcopy since
+    only the board buffers, the empty cells and the union find tables are
+    copied.
+    """
+    state = Gamestate.__new__(Gamestate)
+    state.__dict__.update(self.__dict__)
+    state.board = self.board[:]
+    state.revealed = self.revealed[:]
+    state.white_groups = self.white_groups.clone()
+    state.black_groups = self.black_groups.clone()
+    state.empty = self.empty.copy()
+    state.rings = self.rings[:]
+    state.trail = self.trail[:]
+    return state
+
   def get_white_groups(self):
-    return self.white_groups.get_groups()
+    return self.cell_groups(self.white_groups)
   
   def get_black_groups(self):
-    return self.black_groups.get_groups()
+    return self.cell_groups(self.black_groups)
+
+  def cell_groups(self, groups):
+    """
+    Return the groups of a union find structure with their members converted
+    back to cells.
+    """
+    return {rep: [divmod(index, self.size) for index in members]
+            for rep, members in groups.get_groups().items()}
+
+  def index(self, cell):
+    """Return the union find element representing a cell or an edge."""
+    if cell == self.EDGE1:
+      return self.edge1
+    elif cell == self.EDGE2:
+      return self.edge2
+    return cell[0] * self.size + cell[1]
 
   def play(self, cell):
     """
@@ -62,45 +111,101 @@ class Gamestate:
     elif(self.toplay == self.PLAYERS["black"]):
       self.place_black(cell)
       self.toplay = self.PLAYERS["white"]
+    self.hash ^= self.tables.zobrist_turn
     self.num_played += 1
 
   def place_white(self, cell):
     """
     Place a white stone regardless of whose turn it is.
     """
-    if(self.board[cell] == self.PLAYERS["none"]):
-      self.board[cell] = self.PLAYERS["white"]
-      self.empty.remove(cell)
+    index = cell[0] * self.size + cell[1]
+    if(self.board[index] == self.PLAYERS["none"]):
+      self.trail.append((index, self.toplay, self.num_played, self.hash,
+                         len(self.white_groups.history),
+                         len(self.black_groups.history)))
+      self.board[index] = self.PLAYERS["white"]
+      self.hash ^= self.tables.zobrist[self.PLAYERS["white"]][index]
+      self.empty.remove(index)
     else:
       raise ValueError("Cell occupied")
     # if the placed cell touches a white edge connect it appropriately
     if(cell[0] == 0):
-      self.white_groups.join(self.EDGE1, cell)
+      self.white_groups.join(self.edge1, index)
     if(cell[0] == self.size - 1):
-      self.white_groups.join(self.EDGE2, cell)
+      self.white_groups.join(self.edge2, index)
     # join any groups connected by the new white stone
-    for n in self.neighbors(cell):
-      if(self.board[n] == self.PLAYERS["white"]):
-        self.white_groups.join(n, cell)
+    for nb in self.tables.neighbor_ids[index]:
+      if(self.board[nb] == self.PLAYERS["white"]):
+        self.white_groups.join(nb, index)
 
   def place_black(self, cell):
     """
     Place a black stone regardless of whose turn it is.
     """
-    if(self.board[cell] == self.PLAYERS["none"]):
-      self.board[cell] = self.PLAYERS["black"]
-      self.empty.remove(cell)
+    index = cell[0] * self.size + cell[1]
+    if(self.board[index] == self.PLAYERS["none"]):
+      self.trail.append((index, self.toplay, self.num_played, self.hash,
+                         len(self.white_groups.history),
+                         len(self.black_groups.history)))
+      self.board[index] = self.PLAYERS["black"]
+      self.hash ^= self.tables.zobrist[self.PLAYERS["black"]][index]
+      self.empty.remove(index)
     else:
       raise ValueError("Cell occupied")
     #if the placed cell touches a black edge connect it appropriately
     if(cell[1] == 0):
-      self.black_groups.join(self.EDGE1, cell)
+      self.black_groups.join(self.edge1, index)
     if(cell[1] == self.size - 1):
-      self.black_groups.join(self.EDGE2, cell)
+      self.black_groups.join(self.edge2, index)
     #join any groups connected by the new black stone
-    for n in self.neighbors(cell):
-      if(self.board[n] == self.PLAYERS["black"]):
-        self.black_groups.join(n, cell)
+    for nb in self.tables.neighbor_ids[index]:
+      if(self.board[nb] == self.PLAYERS["black"]):
+        self.black_groups.join(nb, index)
+
+  def undo(self):
+    """
+    Take back the most recently placed stone, restoring the turn, move count
+    and hash to what they were before it was placed.
+    """
+    self.restore(len(self.trail) - 1)
+
+  def snapshot(self):
+    """
+    Return a marker for the current position, stones placed afterwards can be
+    taken back all at once by passing it to restore.
+    """
+    return len(self.trail)
+
+  def restore(self, snapshot):
+    """
+    Take back every stone placed since snapshot was taken. The empty cells and
+    the union find structures are rolled back once to the marks saved with the
+    earliest stone, the codes of rings only for the stones they include.
+    """
+    if len(self.trail) <= snapshot:
+      return
+    undone = self.trail[snapshot:]
+    del self.trail[snapshot:]
+    if self.ring_mark > snapshot:
+      ring_steps = self.tables.ring_steps
+      for entry in undone[:self.ring_mark - snapshot]:
+        for nb, step in ring_steps[self.board[entry[0]]][entry[0]]:
+          self.rings[nb] -= step
+      self.ring_mark = snapshot
+    for index, toplay, num_played, key, white_mark, black_mark in undone:
+      self.board[index] = self.PLAYERS["none"]
+    self.empty.restore(len(self.empty) + len(undone))
+    index, toplay, num_played, key, white_mark, black_mark = undone[0]
+    self.toplay = toplay
+    self.num_played = num_played
+    self.hash = key
+    self.white_groups.rollback(white_mark)
+    self.black_groups.rollback(black_mark)
+
+  def play_hash(self, cell):
+    """Return the hash the state would have after play(cell)."""
+    return (self.hash ^ self.tables.zobrist[self.toplay][
+      cell[0] * self.size + cell[1]] ^ self.tables.zobrist_turn)
 
   def turn(self):
     """
@@ -113,6 +218,8 @@ class Gamestate:
     Set the player to take the next move.
     """
     if(player in self.PLAYERS.values() and player != self.PLAYERS["none"]):
+      if player != self.toplay:
+        self.hash ^= self.tables.zobrist_turn
       self.toplay = player
     else:
       raise ValueError('Invalid turn: ' + str(player))
@@ -122,13 +229,49 @@ class Gamestate:
     Return a number corresponding to the winning player,
     or none if the game is not over.
     """
-    if(self.white_groups.connected(self.EDGE1, self.EDGE2)):
+    if(self.white_groups.connected(self.edge1, self.edge2)):
       return self.PLAYERS["black"]
-    elif(self.black_groups.connected(self.EDGE1, self.EDGE2)):
+    elif(self.black_groups.connected(self.edge1, self.edge2)):
       return self.PLAYERS["white"]
     else:
       return self.PLAYERS["none"]
     
+  def random_fill(self):
+    """
+    Return a copy of the board with every empty cell filled by alternating
+    stones in a uniformly random order, starting with the player to move.
+    The state itself is left untouched.
+    """
+    board = self.board[:]
+    cells = list(self.empty)
+    random.shuffle(cells)
+    for index in cells[0::2]:
+      board[index] = self.toplay
+    for index in cells[1::2]:
+      board[index] = self.OPPONENT[self.toplay]
+    return board
+
+  def filled_winner(self, board):
+    """
+    Return the winner of a completely filled board such as one returned by
+    random_fill. Exactly one player connects their edges on a full board, and
+    the first player to connect stays connected, so a single flood fill of the
+    white stones from white's first edge decides the game.
+    """
+    white = self.PLAYERS["white"]
+    seen = set(y for y in range(self.size) if board[y] == white)
+    stack = list(seen)
+    last_row = (self.size - 1) * self.size
+    while len(stack) > 0:
+      index = stack.pop()
+      if index >= last_row:
+        return self.PLAYERS["black"]
+      for nb in self.tables.neighbor_ids[index]:
+        if board[nb] == white and nb not in seen:
+          seen.add(nb)
+          stack.append(nb)
+    return self.PLAYERS["white"]
+
   def would_lose(self, cell, color):
     """
     Return True is the move indicated by cell and color would lose the game,
@@ -141,20 +284,20 @@ class Gamestate:
         connect1 = True
       elif cell[1] == self.size - 1:
         connect2 = True
-      for n in self.neighbors(cell):
-        if self.black_groups.connected(self.EDGE1, n):
+      for nb in self.tables.neighbor_ids[cell[0] * self.size + cell[1]]:
+        if self.black_groups.connected(self.edge1, nb):
           connect1 = True
-        elif self.black_groups.connected(self.EDGE2, n):
+        elif self.black_groups.connected(self.edge2, nb):
           connect2 = True
     elif color == self.PLAYERS["white"]:
       if cell[0] == 0:
         connect1 = True
       elif cell[0] == self.size - 1:
         connect2 = True
-      for n in self.neighbors(cell):
-        if self.white_groups.connected(self.EDGE1, n):
+      for nb in self.tables.neighbor_ids[cell[0] * self.size + cell[1]]:
+        if self.white_groups.connected(self.edge1, nb):
           connect1 = True
-        elif self.white_groups.connected(self.EDGE2, n):
+        elif self.white_groups.connected(self.edge2, nb):
           connect2 = True
       
     return connect1 and connect2
@@ -170,12 +313,13 @@ class Gamestate:
     for y in range(self.size):
       ret += str(y + 1) + ' ' * (offset * 2 + coord_size - len(str(y + 1)))
       for x in range(self.size):
-        if(self.board[x, y] == self.PLAYERS["white"] and
-           (self.revealed[x, y] == self.DARK_STATE["visible"] or
+        index = x * self.size + y
+        if(self.board[index] == self.PLAYERS["white"] and
+           (self.revealed[index] == self.DARK_STATE["visible"] or
             player == self.PLAYERS["white"])):
           ret += self.DISP_WHITE
-        elif(self.board[x,y] == self.PLAYERS["black"] and
-             (self.revealed[x, y] == self.DARK_STATE["visible"] or
+        elif(self.board[index] == self.PLAYERS["black"] and
+             (self.revealed[index] == self.DARK_STATE["visible"] or
               player == self.PLAYERS["black"])):
           ret += self.DISP_BLACK
         else:
@@ -188,39 +332,23 @@ class Gamestate:
     return ret      
 
   def neighbors(self, cell, color=None):
-    """Return list of neighbors of the passed cell."""
+    """
+    Return a tuple of the neighbors of the passed cell, or of the cells along
+    an edge of the passed color.
+    """
     if cell == self.EDGE1:
-      if color == self.PLAYERS["black"]:
-        nb = []
-        for i in range(self.size):
-          nb.append((i, 0))
-      elif color == self.PLAYERS["white"]:
-        nb = []
-        for i in range(self.size):
-          nb.append((0, i))
-      return nb
+      return self.tables.edge_neighbors[color][0]
     elif cell == self.EDGE2:
-      nb = []
-      if color == self.PLAYERS["black"]:
-        for i in range(self.size):
-          nb.append((i, self.size -1))
-      elif color == self.PLAYERS["white"]:
-        for i in range(self.size):
-          nb.append((self.size -1, i))
-      return nb
-    x = cell[0]
-    y=cell[1]
-    return [(n[0]+x , n[1]+y) for n in self.neighbor_patterns\
-      if (0<=n[0]+x and n[0]+x<self.size and 0<=n[1]+y and n[1]+y<self.size)]
+      return self.tables.edge_neighbors[color][1]
+    return self.tables.neighbors[cell]
 
   def moves(self):
     """Get a list of all moves possible on the current board."""
-    moves = []
-    for y in range(self.size):
-      for x in range(self.size):
-        if self.board[x,y] == self.PLAYERS["none"]:
-          moves.append((x,y))
-    return moves
+    return [self.tables.cells[index] for index in self.empty]
+
+  def random_move(self):
+    """Return a uniformly random empty cell in constant time."""
+    return self.tables.cells[self.empty.choice()]
   
   def blank_ldiagonal(self):
     """
@@ -228,7 +356,7 @@ class Gamestate:
     False otherwise.
     """
     for i in range(self.size):
-      if self.board[i, i] != self.PLAYERS["none"]:
+      if self.board[i * self.size + i] != self.PLAYERS["none"]:
         return False
     return True
     
@@ -238,42 +366,101 @@ class Gamestate:
     False otherwise.
     """
     for i in range(self.size):
-      if self.board[i, self.size - i - 1] != self.PLAYERS["none"]:
+      if self.board[(i + 1) * self.size - i - 1] != self.PLAYERS["none"]:
         return False
     return True
   
+  def sync_rings(self):
+    """
+    Return the codes of the colors around every cell as an array('H'),
+    bringing them up to date first with the stones placed since they were
+    last used. Rollouts never use them, so placing a stone leaves them alone
+    and they only follow the moves of the tree.
+    """
+    ring_steps = self.tables.ring_steps
+    rings = self.rings
+    for entry in self.trail[self.ring_mark:]:
+      for nb, step in ring_steps[self.board[entry[0]]][entry[0]]:
+        rings[nb] += step
+    self.ring_mark = len(self.trail)
+    return rings
+
+  def ring_patterns_of(self, flag):
+    """
+    Return an array of the cell ids of the empty cells whose ring of
+    neighbors has flag in RING_PATTERNS.
+    """
+    board = np.frombuffer(self.board, dtype=np.uint8)
+    empty = np.flatnonzero(board == self.PLAYERS["none"])
+    codes = np.frombuffer(self.sync_rings(), dtype=np.uint16)[empty]
+    return empty[RING_PATTERNS[codes] & flag != 0]
+
+  def dead_cells(self):
+    """
+    Return an array of the cell ids of the empty cells found dead by a local
+    pattern, which never matter to who connects whatever color they get.
+    A cell is dead if four of its neighbors in a row around it, or three in
+    a row along with the neighbor opposite the middle one, have the color of
+    the first ones and the opposite one that of the other player. The edges
+    count as stones of their color.
+    """
+    return self.ring_patterns_of(RING_DEAD)
+
+  def vulnerable_cells(self, color):
+    """
+    Return an array of the cell ids of the empty cells that are not dead but
+    become dead by a local pattern once color plays one of their empty
+    neighbors. The neighbor of a corner beyond both edges counts as empty in
+    the codes but cannot be played. Its two neighbors in the ring are edges
+    of different colors, so a stone on it never completes a pattern alone
+    and nothing has to be left out for it.
+    """
+    return self.ring_patterns_of(RING_VULNERABLE[color])
+
   def get_color(self, cell):
     """Returns the color of cell."""
-    return self.board[cell[0], cell[1]]
+    return self.board[cell[0] * self.size + cell[1]]
   
   def reachable(self, colors, stopset, start):
     """
     Returns a set containing the cells reachable from start by going through 
     cells of a color in colors and without crossing cells in the stopset.
+    start is a cell or one of the edges of colors[0].
     """
-    seen = set([start])
-    queue = deque([start])
-    while len(queue) > 0:
-      cell = queue.popleft()
-      if cell in stopset:
-        continue
-      
-      for nb in self.neighbors(cell, colors[0]):
-        if self.get_color(nb) in colors and nb not in seen:
-          queue.append(nb)
-          seen.add(nb)
-          
+    tables = self.tables
+    passable = self.color_mask(colors)
+    if start == self.EDGE1:
+      seed = tables.edge_masks[colors[0]][0] & passable
+    elif start == self.EDGE2:
+      seed = tables.edge_masks[colors[0]][1] & passable
+    else:
+      seed = 1 << (start[0] * self.size + start[1])
+    stop = tables.ids_mask(cell[0] * self.size + cell[1] for cell in stopset)
+    reach = tables.flood(seed, passable, stop)
+    seen = set(tables.cells[index] for index in tables.mask_ids(reach))
+    seen.add(start)
     return seen
+
+  def color_mask(self, colors, board=None):
+    """
+    Return the bit mask over cell ids of the cells of board, by default the
+    board of this state, holding one of colors.
+    """
+    if board is None:
+      board = self.board
+    cells = np.isin(np.frombuffer(board, dtype=np.uint8), colors)
+    return int.from_bytes(np.packbits(cells, bitorder="little").tobytes(),
+                          "little")
   
   def get_empty_cell_set(self):
     """Return the set of empty cells."""
-    return self.empty
+    return set(self.moves())
   
   def connected(self, color, cell1, cell2):
     if color == self.PLAYERS["black"]:
-      return self.black_groups.connected(cell1, cell2)
+      return self.black_groups.connected(self.index(cell1), self.index(cell2))
     elif color == self.PLAYERS["white"]:
-      return self.white_groups.connected(cell1, cell2)
+      return self.white_groups.connected(self.index(cell1), self.index(cell2))
 
   def __str__(self):
     """Print an ascii representation of the game board."""
@@ -288,9 +475,9 @@ class Gamestate:
     for y in range(self.size):
       ret+=str(y+1)+' '*(offset*2+coord_size-len(str(y+1)))
       for x in range(self.size):
-        if(self.board[x, y] == self.PLAYERS["white"]):
+        if(self.board[x * self.size + y] == self.PLAYERS["white"]):
           ret+=self.DISP_WHITE
-        elif(self.board[x,y] == self.PLAYERS["black"]):
+        elif(self.board[x * self.size + y] == self.PLAYERS["black"]):
           ret+=self.DISP_BLACK
         else:
           ret+=self.DISP_EMPTY
@@ -298,4 +485,179 @@ class Gamestate:
       ret+=self.DISP_WHITE+"\n"+' '*offset*(y+1)
     ret+=' '*(offset*2+1)+(self.DISP_BLACK+' '*offset*2)*self.size
 
-    return ret
\ No newline at end of file
+    return ret
+
+
+class Boardtables:
+  """
+  Lookup tables that only depend on the size of the board. They are built the
+  first time a size is used and shared by every Gamestate of that size.
+  """
+  # the zobrist keys are drawn from a fixed seed so hashes are reproducible
+  ZOBRIST_SEED = "rhex zobrist"
+
+  def __init__(self, size):
+    """
+    Build the neighbors of every cell, both as cells and as the integer
+    indices x * size + y, the cells along each edge of both colors and the
+    zobrist keys of a stone of each color on each cell and of black to move.
+    """
+    self.size = size
+    self.cells = tuple((x, y) for x in range(size) for y in range(size))
+    self.neighbors = {}
+    neighbor_ids = []
+    for x, y in self.cells:
+      nb = tuple((x + dx, y + dy) for dx, dy in Gamestate.neighbor_patterns
+                 if 0 <= x + dx < size and 0 <= y + dy < size)
+      self.neighbors[(x, y)] = nb
+      neighbor_ids.append(tuple(n[0] * size + n[1] for n in nb))
+    self.neighbor_ids = tuple(neighbor_ids)
+
+    black = Gamestate.PLAYERS["black"]
+    white = Gamestate.PLAYERS["white"]
+
+    # the colors of the neighbors of a cell in order around it make a base 3
+    # code, digit k holding the color of the neighbor at ring_patterns[k]
+    # and a neighbor off the board beyond an edge the color of that edge.
+    # ring_ids holds the neighbors of every cell in that order, -1 off the
+    # board, and ring_weights those on the board with the weight of their
+    # digit and edge_rings the code of every cell of the empty board, where a
+    # neighbor beyond both edges is left empty.
+    # ring_steps holds for each color the neighbors of every cell with the
+    # change of their code by a stone of that color on it.
+    num_cells = size * size
+    ring_ids = []
+    edge_rings = array("H")
+    for x, y in self.cells:
+      ids = []
+      code = 0
+      for k, (dx, dy) in enumerate(Gamestate.ring_patterns):
+        off_x = not 0 <= x + dx < size
+        off_y = not 0 <= y + dy < size
+        ids.append(-1 if off_x or off_y else (x + dx) * size + y + dy)
+        if off_x and not off_y:
+          code += white * 3 ** k
+        elif off_y and not off_x:
+          code += black * 3 ** k
+      ring_ids.append(ids)
+      edge_rings.append(code)
+    self.ring_ids = tuple(tuple(ids) for ids in ring_ids)
+    self.ring_weights = tuple(tuple((nb, 3 ** k) for k, nb in enumerate(ids)
+                                    if nb >= 0)
+                              for ids in ring_ids)
+    self.edge_rings = edge_rings
+    weights = [{nb: 3 ** k for k, nb in enumerate(ids)} for ids in ring_ids]
+    self.ring_steps = {
+      color : tuple(tuple((nb, color * weights[nb][index])
+                          for nb in neighbor_ids[index])
+                    for index in range(num_cells))
+      for color in (white, black)}
+    self.edge_neighbors = {
+      black : (tuple((i, 0) for i in range(size)),
+               tuple((i, size - 1) for i in range(size))),
+      white : (tuple((0, i) for i in range(size)),
+               tuple((size - 1, i) for i in range(size)))}
+
+    rng = random.Random(self.ZOBRIST_SEED + str(size))
+    self.zobrist = {
+      white : tuple(rng.getrandbits(64) for i in range(size * size)),
+      black : tuple(rng.getrandbits(64) for i in range(size * size))}
+    self.zobrist_turn = rng.getrandbits(64)
+
+    # bit masks over cell ids, bit x * size + y standing for cell (x, y),
+    # of the whole board, of the cells with y = 0 and y = size - 1, of the
+    # cells along each edge of both colors and of the neighbors of each cell
+    self.full_mask = (1 << size * size) - 1
+    self.first_column = sum(1 << x * size for x in range(size))
+    self.last_column = self.first_column << size - 1
+    first_row = (1 << size) - 1
+    self.edge_masks = {
+      black : (self.first_column, self.last_column),
+      white : (first_row, first_row << size * (size - 1))}
+    self.neighbor_masks = tuple(self.ids_mask(nb) for nb in neighbor_ids)
+
+  def spread(self, mask):
+    """Return mask along with every neighbor of its cells."""
+    size = self.size
+    # cells with a neighbor at y - 1 and at y + 1
+    down = mask & ~self.first_column
+    up = mask & ~self.last_column
+    return (mask | mask >> size | mask << size | down >> 1 | up << 1 |
+            up >> size - 1 | down << size - 1) & self.full_mask
+
+  def flood(self, seed, passable, stop=0):
+    """
+    Return the mask of the cells reached from the cells of seed by moving
+    from neighbor to neighbor over the cells of passable. Cells of stop are
+    reached but not moved on from. The whole frontier is spread at once, so
+    it takes one step per cell of the longest path.
+    """
+    reach = seed
+    frontier = seed
+    while frontier:
+      frontier = self.spread(frontier & ~stop) & passable & ~reach
+      reach |= frontier
+    return reach
+
+  def ids_mask(self, ids):
+    """Return the mask of the passed cell ids."""
+    mask = 0
+    for index in ids:
+      mask |= 1 << index
+    return mask
+
+  def mask_ids(self, mask):
+    """Return a list of the cell ids in mask in increasing order."""
+    bits = bin(mask)[:1:-1]
+    return [index for index in range(len(bits)) if bits[index] == "1"]
+
+
+# Boardtables for every board size used so far
+board_tables = {}
+
+def ring_dead(digits):
+  """
+  Return True if a cell with the colors digits in order around it is dead
+  (see Gamestate.dead_cells).
+  """
+  for own in (Gamestate.PLAYERS["white"], Gamestate.PLAYERS["black"]):
+    other = Gamestate.OPPONENT[own]
+    for start in range(6):
+      ring = [digits[(start + k) % 6] for k in range(5)]
+      if (ring[0] == ring[1] == ring[2] == own and
+          (ring[3] == own or ring[4] == other)):
+        return True
+  return False
+
+def ring_pattern_table():
+  """
+  Return the RING_PATTERNS flags of every base 3 code of the colors around a
+  cell (see Boardtables) as an array indexed by the code. The patterns do
+  not depend on the size of the board, the edges being part of the codes.
+  """
+  codes = range(3 ** 6)
+  digits = [[code // 3 ** k % 3 for k in range(6)] for code in codes]
+  dead = [ring_dead(ring) for ring in digits]
+  table = np.zeros(len(codes), dtype=np.uint8)
+  for code in codes:
+    if dead[code]:
+      table[code] = RING_DEAD
+      continue
+    for color, flag in RING_VULNERABLE.items():
+      if any(dead[code + color * 3 ** k] for k in range(6)
+             if digits[code][k] == Gamestate.PLAYERS["none"]):
+        table[code] |= flag
+  return table
+
+# flags of RING_PATTERNS, a cell is dead or, for each color, vulnerable to a
+# move of that color next to it (see Gamestate.vulnerable_cells)
+RING_DEAD = 1
+RING_VULNERABLE = {Gamestate.PLAYERS["white"] : 2,
+                   Gamestate.PLAYERS["black"] : 4}
+RING_PATTERNS = ring_pattern_table()
+
+def get_tables(size):
+  """Return the Boardtables of a board size, building them if needed."""
+  if size not in board_tables:
+    board_tables[size] = Boardtables(size)
+  return board_tables[size]
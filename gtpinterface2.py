@@ -5,11 +5,13 @@ starter code from Mopyhex at https://github.com/yotomyoto/mopyhex
 """
 
 import sys
+from time import perf_counter
 from mctsagent import Mctsagent
 from decisive_move_mctsagent import DecisiveMoveMctsagent
 from lgr_mctsagent import LGRMctsagent
 from dca_mctsagent import DCAMctsagent
 from poolrave_mctsagent import PoolraveMctsagent
+from pattern_mctsagent import PatternMctsagent
 from rave_mctsagent import RaveMctsagent
 from gamestate import Gamestate
 version = 0.1
@@ -26,12 +28,13 @@ class GTPInterface2:
   
   AGENTS = {"decisive_move": DecisiveMoveMctsagent, "lgr": LGRMctsagent,
             "dca": DCAMctsagent, "basic": RaveMctsagent,
-            "poolrave": PoolraveMctsagent} 
+            "poolrave": PoolraveMctsagent, "pattern": PatternMctsagent} 
   
-  def __init__(self, agent_name="basic"):
+  def __init__(self, agent_name="basic", workers=1):
     """
     Initilize the list of available commands, binding appropriate names to the
-    funcitons defined in this file.
+    funcitons defined in this file. workers is the number of processes the
+    agent searches with.
     """
     commands={}
     commands["name"] = self.gtp_name
@@ -51,18 +54,24 @@ class GTPInterface2:
     commands["winner"] = self.gtp_winner
     commands["hexgui-analyze_commands"] = self.gtp_analyze
     commands["agent"] = self.gtp_agent
+    commands["workers"] = self.gtp_workers
+    commands["node_budget"] = self.gtp_node_budget
     self.commands = commands
     self.game = Gamestate(8)
     self.agent_name = agent_name
+    self.workers = workers
+    self.node_budget = 0
     try:
-      self.agent = self.AGENTS[agent_name]()
+      self.agent = self.AGENTS[agent_name](workers=workers)
     except KeyError:
       print("Unknown agent defaulting to basic")
       self.agent_name = "basic"
-      self.agent = self.AGENTS[agent_name]()
+      self.agent = self.AGENTS[agent_name](workers=workers)
     self.agent.set_gamestate(self.game)
     self.move_time = 10
     self.last_move = None
+    # seconds of move time left unused by genmove since the interface started
+    self.saved_time = 0
 
   def send_command(self, command):
     """
@@ -230,8 +239,19 @@ class GTPInterface2:
       else:
         return (False, "Player not recognized")
 
+    #a special case move is played without searching, the search itself
+    #may stop early once its best move is settled
+    start = perf_counter()
     move = self.agent.special_case(self.last_move)
-    self.agent.search(self.move_time)
+    if not move:
+      if len(self.game.empty) <= self.agent.ENDGAME_CELLS:
+        move = self.agent.solve_endgame(self.move_time)
+      else:
+        self.agent.search(self.move_time)
+      sys.stderr.write("Peak node count: "+str(self.agent.peak_nodes)+"\n")
+    saved = max(0, self.move_time - (perf_counter() - start))
+    self.saved_time += saved
+    sys.stderr.write("Saved time: "+str(round(saved, 2))+" sec\n")
 
     if not move:
       move = self.agent.best_move()
@@ -258,6 +278,41 @@ class GTPInterface2:
     self.move_time = time
     return (True, "")
 
+  def gtp_workers(self, args):
+    """
+    Change the number of processes the agent searches with, each one runs an
+    independent search and their root statistics are combined (1 searches in
+    this process only).
+    """
+    if(len(args)<1):
+      return (False, "Not enough arguments")
+    try:
+      workers = int(args[0])
+    except ValueError:
+      return (False, "Argument is not a valid number of workers")
+    if workers<1:
+      return (False, "Argument is not a valid number of workers")
+    self.workers = workers
+    self.agent.set_workers(workers)
+    return (True, "")
+
+  def gtp_node_budget(self, args):
+    """
+    Change the maximum number of nodes in the agent's search tree (0 for no
+    limit), once it is reached leaves are no longer expanded.
+    """
+    if(len(args)<1):
+      return (False, "Not enough arguments")
+    try:
+      budget = int(args[0])
+    except ValueError:
+      return (False, "Argument is not a valid node budget")
+    if budget<0:
+      return (False, "Argument is not a valid node budget")
+    self.node_budget = budget
+    self.agent.set_node_budget(budget)
+    return (True, "")
+
   def gtp_show(self, args):
     """
     Return an ascii representation of the current state of the game board.
@@ -299,9 +354,12 @@ class GTPInterface2:
       return (True, ret)
     else:
       try:
-        self.agent = self.AGENTS[args[0]](self.game)
+        agent = self.AGENTS[args[0]](self.game, self.workers)
       except KeyError:
         return (False, "Unknown agent")
+      self.agent.set_workers(1)
+      self.agent = agent
+      self.agent.set_node_budget(self.node_budget)
       self.agent_name = args[0]
       return (True, "")
 
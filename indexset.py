@@ -0,0 +1,79 @@
+from array import array
+import random
+
+class Indexset:
+  """
+  Set of integers from 0 to capacity - 1 supporting O(1) membership, removal,
+  addition and uniformly random choice.
+  Every integer is always stored once in a dense array together with a map of
+  its position in it. The members of the set are the first len(self) entries,
+  removing a member swaps it just past the end of that live part.
+  """
+
+  def __init__(self, capacity, full=True):
+    """Initialize the set with all of 0 to capacity - 1, or with none."""
+    self.items = array('i', range(capacity))
+    self.pos = array('i', range(capacity))
+    self.count = capacity if full else 0
+
+  def copy(self):
+    """Return an independent copy of the set."""
+    other = Indexset.__new__(Indexset)
+    other.items = self.items[:]
+    other.pos = self.pos[:]
+    other.count = self.count
+    return other
+
+  def __len__(self):
+    return self.count
+
+  def __contains__(self, x):
+    return self.pos[x] < self.count
+
+  def __iter__(self):
+    return iter(self.items[:self.count])
+
+  def swap(self, i, j):
+    """Swap the entries at positions i and j of the dense array."""
+    items = self.items
+    x = items[i]
+    y = items[j]
+    items[i] = y
+    items[j] = x
+    self.pos[x] = j
+    self.pos[y] = i
+
+  def add(self, x):
+    """Add x to the set if it is not already a member."""
+    if self.pos[x] >= self.count:
+      self.swap(self.pos[x], self.count)
+      self.count += 1
+
+  def remove(self, x):
+    """Remove x from the set, raise KeyError if it is not a member."""
+    if self.pos[x] >= self.count:
+      raise KeyError(x)
+    self.count -= 1
+    self.swap(self.pos[x], self.count)
+
+  def discard(self, x):
+    """Remove x from the set if it is a member."""
+    if self.pos[x] < self.count:
+      self.count -= 1
+      self.swap(self.pos[x], self.count)
+
+  def choice(self):
+    """Return a uniformly random member of the set."""
+    return self.items[int(random.random() * self.count)]
+
+  def snapshot(self):
+    """Return a marker for the current members to pass to restore."""
+    return self.count
+
+  def restore(self, snapshot):
+    """
+    Put back every member removed since snapshot was taken. Only valid if
+    nothing was added in the meantime, the removed members are then exactly
+    the entries just past the live part of the array.
+    """
+    self.count = snapshot
@@ -9,8 +9,8 @@ from rave_mctsagent import *
 
 class LGRMctsagent(RaveMctsagent):
   
-  def __init__(self, state=Gamestate(8)):
-    super().__init__(state)
+  def __init__(self, state=Gamestate(8), workers=1):
+    super().__init__(state, workers)
     self.black_reply = {}
     self.white_reply = {}
   
@@ -32,7 +32,6 @@ class LGRMctsagent(RaveMctsagent):
     Simulate a random game except that we play all known critical cells first,
     return the winning player and record critical cells at the end.
     """
-    moves = state.moves()
     first = state.turn()
     if first == Gamestate.PLAYERS["black"]:
       current_reply = self.black_reply
@@ -46,29 +45,19 @@ class LGRMctsagent(RaveMctsagent):
     while(state.winner() == Gamestate.PLAYERS["none"]):
       if last_move in current_reply:
         move = current_reply[last_move]
-        if move not in moves or random.random() > 0.5:
-          move = random.choice(moves)
+        if (state.get_color(move) != Gamestate.PLAYERS["none"] or
+            random.random() > 0.5):
+          move = state.random_move()
       else:
-        move = random.choice(moves)
+        move = state.random_move()
       if state.turn() == Gamestate.PLAYERS["black"]:
         black_moves.append(move)
       else:
         white_moves.append(move)
       current_reply, other_reply = other_reply, current_reply
       state.play(move)
-      moves.remove(move)
       last_move = move
 
-    black_rave_pts = []
-    white_rave_pts = []
-
-    for x in range(state.size):
-      for y in range(state.size):
-        if state.board[(x,y)] == Gamestate.PLAYERS["black"]:
-          black_rave_pts.append((x,y))
-        elif state.board[(x,y)] == Gamestate.PLAYERS["white"]:
-          white_rave_pts.append((x,y))
-    
     offset = 0
     skip = 0          
     if state.winner() == Gamestate.PLAYERS["black"]:
@@ -87,7 +76,7 @@ class LGRMctsagent(RaveMctsagent):
       for i in range(len(black_moves) - skip):
         self.white_reply[black_moves[i]] = white_moves[i + offset]
 
-    return state.winner(), black_rave_pts, white_rave_pts
+    return state.winner(), cell_owners(state)
   
   def set_gamestate(self, state):
     """
@@ -2,16 +2,41 @@ from gamestate import Gamestate
 import time
 from math import sqrt, log
 import random
-from copy import copy, deepcopy
+from copy import copy
 from sys import stderr
-from queue import Queue
+import numpy as np
 inf = float('inf')
 
+def count_nodes(root):
+  """Count the nodes of the subtree under root, root included."""
+  count = 0
+  stack = [root]
+  while stack:
+    node = stack.pop()
+    count += 1
+    stack.extend(node.children)
+  return count
+
+def uct_values(N, Q, parent_N, explore):
+  """
+  Calculate Node.value for arrays of the N and Q of the children of a node
+  visited parent_N times at once.
+  """
+  values = np.full(len(N), inf if explore else 0.0)
+  visited = N > 0
+  N = N[visited]
+  values[visited] = Q[visited]/N + explore*np.sqrt(2*np.log(parent_N)/N)
+  return values
+
+def random_argmax(values):
+  """Return the index of the maximum of values, breaking ties randomly."""
+  return int(random.choice(np.flatnonzero(values == values.max())))
+
 class Node:
   """
   Node for the MCST. Stores the move applied to reach this node from its parent,
   stats for the associated game position, children, parent and outcome 
-  (outcome==none unless the position ends the game).
+  (outcome==none unless the winner of the position is known for certain).
   """
   
   def __init__(self, move = None, parent = None):
@@ -35,7 +60,7 @@ class Node:
   def set_outcome(self, outcome):
     """
     Set the outcome of this node (i.e. if we decide the node is the end of
-    the game)
+    the game or the solver proves its winner)
     """
     self.outcome = outcome
 
@@ -63,10 +88,20 @@ class Mctsagent:
   Basic no frills implementation of an agent that performs MCTS for hex.
   """
   EXPLORATION = 1  
+  # fill the whole board in uniform random rollouts and check the winner once
+  # at the end instead of after every move, the outcome distribution is the
+  # same. Agents with their own rollout policy ignore it.
+  FILL_ROLLOUTS = False
+  # MCTS-Solver: nodes whose position is won for certain are marked with the
+  # winner in their outcome, starting from the terminal leaves found while
+  # expanding and backed up the tree. Moves proven to lose are no longer
+  # selected and the search stops once the root is proven.
+  SOLVER = False
 
   def __init__(self, state=Gamestate(8)):
-    self.rootstate = deepcopy(state)
+    self.rootstate = state.clone()
     self.root = Node()
+    self.node_count = 1
 
   def best_move(self):
     """
@@ -75,9 +110,19 @@ class Mctsagent:
     if(self.rootstate.winner() != Gamestate.PLAYERS["none"]):
       return Gamestate.GAMEOVER
 
+    #play a proven win right away and avoid proven losses while some move
+    #is not lost yet
+    children = self.root.children
+    if self.SOLVER:
+      turn = self.rootstate.turn()
+      won = [n for n in children if n.outcome == turn]
+      open_children = [n for n in children
+                       if n.outcome != Gamestate.OPPONENT[turn]]
+      children = won or open_children or children
+
     #choose the move of the most simulated node breaking ties randomly
-    max_value = max(self.root.children, key = lambda n: n.N).N
-    max_nodes = [n for n in self.root.children if n.N == max_value]
+    max_value = max(children, key = lambda n: n.N).N
+    max_nodes = [n for n in children if n.N == max_value]
     bestchild = random.choice(max_nodes)
     return bestchild.move
 
@@ -91,45 +136,66 @@ class Mctsagent:
         child.parent = None
         self.root = child
         self.rootstate.play(child.move)
+        self.node_count = count_nodes(child)
         return
 
     #if for whatever reason the move is not in the children of
     #the root just throw out the tree and start over
     self.rootstate.play(move)
     self.root = Node()
+    self.node_count = 1
 
   def search(self, time_budget):
     """
     Search and update the search tree for a specified amount of time in seconds.
     """
-    startTime = time.clock()
+    startTime = time.perf_counter()
     num_rollouts = 0
+    snapshot = self.rootstate.snapshot()
 
-    #do until we exceed our time budget
-    while(time.clock() - startTime <time_budget):
+    #do until we exceed our time budget or the game is solved
+    while(time.perf_counter() - startTime <time_budget and
+          not self.root_proven()):
       node, state = self.select_node()
       turn = state.turn()
       outcome = self.roll_out(state)
       self.backup(node, turn, outcome)
+      state.restore(snapshot)
       num_rollouts += 1
 
     stderr.write("Ran "+str(num_rollouts)+ " rollouts in " +\
-            str(time.clock() - startTime)+" sec\n")
+            str(time.perf_counter() - startTime)+" sec\n")
     stderr.write("Node count: "+str(self.tree_size())+"\n")
 
+  def root_proven(self):
+    """Return True if the solver has proven the winner of the rootstate."""
+    return self.SOLVER and self.root.outcome != Gamestate.PLAYERS["none"]
+
   def select_node(self):
-    """Select a node in the tree to preform a single simulation from."""
+    """
+    Select a node in the tree to preform a single simulation from.
+    The moves are played directly on the rootstate, the caller is responsible
+    for restoring it once the simulation is backed up.
+    """
     node = self.root
-    state = deepcopy(self.rootstate)
+    state = self.rootstate
 
     #stop if we find reach a leaf node
     while(len(node.children) !=0 ):
       #decend to the maximum value node, break ties at random
-      max_node = max(node.children, key = lambda n: n.value(self.EXPLORATION))
-      max_value = max_node.value(self.EXPLORATION)
-      max_nodes = [n for n in node.children 
-                   if n.value(self.EXPLORATION) == max_value]
-      node = random.choice(max_nodes)
+      children = node.children
+      N = np.fromiter((n.N for n in children), float, len(children))
+      Q = np.fromiter((n.Q for n in children), float, len(children))
+      values = uct_values(N, Q, node.N, self.EXPLORATION)
+      if self.SOLVER:
+        #skip the moves proven to lose, if they all do simulate from here
+        loser = Gamestate.OPPONENT[state.turn()]
+        lost = np.fromiter((n.outcome == loser for n in children), bool,
+                           len(children))
+        if lost.all():
+          return (node, state)
+        values[lost] = -inf
+      node = children[random_argmax(values)]
       state.play(node.move)
 
       #if some child node has not been explored select it before expanding
@@ -149,12 +215,11 @@ class Mctsagent:
     Simulate an entirely random game from the passed state and return the
     winning player.
     """
-    moves = state.moves()
+    if self.FILL_ROLLOUTS:
+      return state.filled_winner(state.random_fill())
 
     while(state.winner() == Gamestate.PLAYERS["none"]):
-      move = random.choice(moves)
-      state.play(move)
-      moves.remove(move)
+      state.play(state.random_move())
 
     return state.winner()
 
@@ -167,12 +232,31 @@ class Mctsagent:
     #at the node and not the next player to play
     reward = -1 if outcome == turn else 1
 
+    #a node can only become proven if the node below it on the path is
+    proven = self.SOLVER
     while node != None:
       node.N += 1
       node.Q +=reward
+      if proven and node.outcome == Gamestate.PLAYERS["none"]:
+        self.prove(node, turn)
+      proven = node.outcome != Gamestate.PLAYERS["none"]
       reward = -reward
+      turn = Gamestate.OPPONENT[turn]
       node = node.parent
 
+  def prove(self, node, turn):
+    """
+    Mark node, where turn is to move, as won for turn if one of its children
+    is and as lost if all of them are won for the opponent.
+    """
+    if not node.children:
+      return
+    outcomes = [child.outcome for child in node.children]
+    if turn in outcomes:
+      node.set_outcome(turn)
+    elif all(outcome == Gamestate.OPPONENT[turn] for outcome in outcomes):
+      node.set_outcome(Gamestate.OPPONENT[turn])
+
   def expand(self, parent, state):
     """
     Generate the children of the passed "parent" node based on the available
@@ -181,6 +265,8 @@ class Mctsagent:
     children = []
     if(state.winner() != Gamestate.PLAYERS["none"]):
     #game is over at this node so nothing to expand
+      if self.SOLVER:
+        parent.set_outcome(state.winner())
       return False
 
 
@@ -188,6 +274,7 @@ class Mctsagent:
       children.append(Node(move, parent))
 
     parent.add_children(children)
+    self.node_count += len(children)
     return True
 
   def set_gamestate(self, state):
@@ -195,19 +282,12 @@ class Mctsagent:
     Set the rootstate of the tree to the passed gamestate, this clears all the
     information stored in the tree since none of it applies to the new state.
     """
-    self.rootstate = deepcopy(state)
+    self.rootstate = state.clone()
     self.root = Node()
+    self.node_count = 1
 
   def tree_size(self):
     """
-    Count nodes in tree by BFS.
-    """
-    Q = Queue()
-    count = 0
-    Q.put(self.root)
-    while not Q.empty():
-      node = Q.get()
-      count +=1
-      for child in node.children:
-        Q.put(child)
-    return count
+    Return the number of nodes in the tree, counted as they are added.
+    """
+    return self.node_count
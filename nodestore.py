@@ -0,0 +1,194 @@
+"""
+Compact storage for the nodes of a Monte Carlo search tree.
+"""
+import numpy as np
+
+class Nodestore:
+  """
+  Search tree whose nodes are indices into numpy columns instead of objects,
+  the root is node 0.
+  Each node has a parent, its rollout statistics N, Q, N_RAVE and Q_RAVE, an
+  outcome and, once expanded, num_children children out of the num_moves
+  moves it was expanded with, fewer with progressive widening. The children
+  of a node are found through a block of edges starting at first_child, each
+  holding the cell id of a move and the node reached by it. A block has room
+  for max_children edges and is moved to the end when it outgrows them. With
+  transpositions several edges can lead to the same node.
+  The columns are replaced by larger copies as the tree grows, so they must
+  be looked up on the store again after anything is added to it. Threads
+  searching together reserve room beforehand so that the columns stay in
+  place. A block is published by writing its num_children last and read by
+  loading num_children first, so a reader without a lock always finds
+  complete edges.
+  """
+
+  NODE_COLUMNS = ("parent", "first_child", "num_children", "max_children",
+                  "num_moves", "N", "Q", "N_RAVE", "Q_RAVE")
+
+  def __init__(self, num_cells, capacity=1024):
+    """
+    Initialize a store holding only a root without children for a board of
+    num_cells cells, with room for capacity nodes before it has to grow.
+    """
+    self.num_cells = num_cells
+    self.size = 0
+    self.edges = 0
+    for name in self.NODE_COLUMNS:
+      setattr(self, name, np.zeros(capacity, dtype=np.int32))
+    self.outcome = np.zeros(capacity, dtype=np.int8)
+    self.move = np.zeros(capacity, dtype=np.int16)
+    self.child = np.zeros(capacity, dtype=np.int32)
+    self.add_nodes(-1, 1)
+
+  def __len__(self):
+    return self.size
+
+  def reserve(self, nodes, edges):
+    """Grow the columns to hold at least nodes nodes and edges edges."""
+    if nodes > len(self.N):
+      for name in self.NODE_COLUMNS + ("outcome",):
+        setattr(self, name, grow(getattr(self, name), self.size, nodes))
+    if edges > len(self.child):
+      self.move = grow(self.move, self.edges, edges)
+      self.child = grow(self.child, self.edges, edges)
+
+  def has_room(self, nodes, edges):
+    """Return True if nodes nodes and edges edges fit without growing."""
+    return (self.size + nodes <= len(self.N) and
+            self.edges + edges <= len(self.child))
+
+  def add_nodes(self, parent, count):
+    """Add count nodes without children under parent, return the first."""
+    first = self.size
+    if first + count > len(self.N):
+      capacity = max(2 * len(self.N), first + count)
+      for name in self.NODE_COLUMNS + ("outcome",):
+        setattr(self, name, grow(getattr(self, name), first, capacity))
+    self.parent[first:first + count] = parent
+    self.size = first + count
+    return first
+
+  def add_edges(self, count):
+    """Make room for count edges at the end, return the first of them."""
+    first = self.edges
+    if first + count > len(self.child):
+      capacity = max(2 * len(self.child), first + count)
+      self.move = grow(self.move, first, capacity)
+      self.child = grow(self.child, first, capacity)
+    self.edges = first + count
+    return first
+
+  def set_children(self, node, moves, children, room=0):
+    """
+    Give node an edge for each cell id in moves leading to the node at the
+    same position of children, with room for at least room edges in all.
+    """
+    room = max(room, len(moves))
+    first = self.add_edges(room)
+    self.move[first:first + len(moves)] = moves
+    self.child[first:first + len(moves)] = children
+    self.first_child[node] = first
+    self.max_children[node] = room
+    self.num_children[node] = len(moves)
+
+  def add_child(self, node, move, child):
+    """
+    Add an edge from node to child for cell id move, moving the block of
+    node to the end with twice the room if it is full.
+    """
+    first = self.first_child[node]
+    count = self.num_children[node]
+    if count == self.max_children[node]:
+      room = max(2 * count, 1)
+      moved = self.add_edges(room)
+      self.move[moved:moved + count] = self.move[first:first + count]
+      self.child[moved:moved + count] = self.child[first:first + count]
+      self.first_child[node] = first = moved
+      self.max_children[node] = room
+    self.move[first + count] = move
+    self.child[first + count] = child
+    self.num_children[node] = count + 1
+
+  def children(self, node):
+    """
+    Return the cell ids of the moves from node and the children they lead
+    to as two arrays, empty if node has not been expanded.
+    """
+    count = self.num_children[node]
+    first = self.first_child[node]
+    return self.move[first:first + count], self.child[first:first + count]
+
+  def find_child(self, node, move):
+    """Return the child reached from node by cell id move, -1 if none."""
+    moves, children = self.children(node)
+    found = np.flatnonzero(moves == move)
+    if len(found) == 0:
+      return -1
+    return int(children[found[0]])
+
+  def compact(self, root, min_visits=0):
+    """
+    Return a new store holding only root and its descendants, with root as
+    node 0, along with an array mapping every node of this store to its new
+    index or -1 if it was dropped.
+    Nodes other than root visited fewer than min_visits times are kept as
+    leaves, dropping their children.
+    """
+    first_child = self.first_child[:self.size]
+    num_children = self.num_children[:self.size].copy()
+    if min_visits > 0:
+      dropped = self.N[:self.size] < min_visits
+      dropped[root] = False
+      num_children[dropped] = 0
+
+    #collect the reachable nodes breadth first a level at a time
+    index = np.full(self.size, -1, dtype=np.int32)
+    index[root] = 0
+    order = [np.array([root], dtype=np.int32)]
+    kept = 1
+    while len(order[-1]):
+      level = order[-1]
+      level = self.child[edge_ranges(first_child[level], num_children[level])]
+      level = np.unique(level[index[level] < 0]).astype(np.int32)
+      index[level] = np.arange(kept, kept + len(level), dtype=np.int32)
+      kept += len(level)
+      order.append(level)
+    order = np.concatenate(order)
+
+    store = Nodestore.__new__(Nodestore)
+    store.num_cells = self.num_cells
+    store.size = len(order)
+    for name in self.NODE_COLUMNS + ("outcome",):
+      setattr(store, name, getattr(self, name)[order])
+
+    #pack the edge blocks of the kept nodes in their new order without room
+    #to spare
+    counts = num_children[order]
+    edges = edge_ranges(first_child[order], counts)
+    store.move = self.move[edges]
+    store.child = index[self.child[edges]]
+    store.edges = len(edges)
+    store.num_children = counts
+    store.max_children = counts.copy()
+    store.first_child = (np.cumsum(counts) - counts).astype(np.int32)
+
+    store.parent = np.where(store.parent >= 0, index[store.parent],
+                            -1).astype(np.int32)
+    store.parent[0] = -1
+    return store, index
+
+
+def grow(column, used, capacity):
+  """Return a copy of column with room for capacity entries, used of them."""
+  grown = np.zeros(capacity, dtype=column.dtype)
+  grown[:used] = column[:used]
+  return grown
+
+def edge_ranges(firsts, counts):
+  """
+  Return the positions of the edge blocks of counts edges starting at
+  firsts, one after the other, as an array.
+  """
+  ends = np.cumsum(counts)
+  return (np.arange(ends[-1] if len(ends) else 0, dtype=np.intp) +
+          np.repeat(firsts.astype(np.intp) - (ends - counts), counts))
@@ -0,0 +1,76 @@
+"""
+Monte Carlo tree search reverse hex player with a local pattern rollout
+policy
+starter code from Mopyhex at https://github.com/yotomyoto/mopyhex
+"""
+from rave_mctsagent import *
+
+
+def bridge_replies(color):
+  """
+  Return the replies of color to a move of the other player for every base 3
+  code of the colors around the cell of that move (see Boardtables), as a
+  tuple indexed by the code of tuples of positions around the cell.
+  The move intrudes into a bridge of color when two neighbors of the cell
+  one apart around it belong to color, stones or an edge, and the neighbor
+  between them is empty. Color saves the bridge by playing there.
+  """
+  replies = []
+  for code in range(3 ** 6):
+    digits = [code // 3 ** k % 3 for k in range(6)]
+    replies.append(tuple(
+      k for k in range(6)
+      if digits[k] == Gamestate.PLAYERS["none"] and
+      digits[k - 1] == digits[(k + 1) % 6] == color))
+  return tuple(replies)
+
+# the replies of each color to the move before, by the code of its ring
+REPLIES = {color : bridge_replies(color)
+           for color in (Gamestate.PLAYERS["white"],
+                         Gamestate.PLAYERS["black"])}
+
+
+class PatternMctsagent(RaveMctsagent):
+
+  def special_case(self, last_move):
+    """Return a move found without search, None otherwise."""
+    size = self.rootstate.size
+    moves = self.rootstate.moves()
+
+    if size < 6:
+      move = self.get_small_board_move(last_move, size, moves)
+      if move is not None:
+        return move
+
+    move = self.get_starting_move(last_move, size, moves)
+    return move
+
+  def roll_out(self, state):
+    """
+    Simulate a random game except that a player answers the move before
+    with a reply from REPLIES whenever the ring of neighbors of that move
+    has one, return the winning player and the owners of the cells at the
+    end. Finding the replies is a single lookup by the code of the ring,
+    which is read from the board since the codes of Gamestate.sync_rings
+    cost more to keep up to date move by move.
+    """
+    tables = state.tables
+    board = state.board
+    cells = tables.cells
+    while state.winner() == Gamestate.PLAYERS["none"]:
+      move = None
+      if state.trail:
+        last = state.trail[-1][0]
+        code = tables.edge_rings[last]
+        for nb, weight in tables.ring_weights[last]:
+          code += board[nb] * weight
+        replies = REPLIES[state.turn()][code]
+        if replies:
+          index = tables.ring_ids[last][random.choice(replies)]
+          if index >= 0:
+            move = cells[index]
+      if move is None:
+        move = state.random_move()
+      state.play(move)
+
+    return state.winner(), cell_owners(state)
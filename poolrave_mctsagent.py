@@ -7,8 +7,8 @@ from rave_mctsagent import *
 
 class PoolraveMctsagent(RaveMctsagent):
   
-  def __init__(self, state=Gamestate(8)):
-    super().__init__(state)
+  def __init__(self, state=Gamestate(8), workers=1):
+    super().__init__(state, workers)
     self.black_rave = {}
     self.white_rave = {} 
   
@@ -29,7 +29,6 @@ class PoolraveMctsagent(RaveMctsagent):
     """Simulate a random game except that we play all known critical
     cells first, return the winning player and record critical cells at the end.
     """
-    moves = state.moves()
     black_rave_moves = sorted(self.black_rave.keys(),
                               key=lambda cell: self.black_rave[cell])
     white_rave_moves = sorted(self.white_rave.keys(),
@@ -38,13 +37,13 @@ class PoolraveMctsagent(RaveMctsagent):
     white_pool = []
     i = 0
     while len(black_pool) < 10 and i < len(black_rave_moves):
-      if black_rave_moves[i] in moves:
+      if state.get_color(black_rave_moves[i]) == Gamestate.PLAYERS["none"]:
         black_pool.append(black_rave_moves[i])
       i += 1
       
     i = 0
     while len(white_pool) < 10 and i < len(white_rave_moves):
-      if white_rave_moves[i] in moves:
+      if state.get_color(white_rave_moves[i]) == Gamestate.PLAYERS["none"]:
         white_pool.append(white_rave_moves[i])
       i += 1
     num_pool = 0
@@ -56,19 +55,15 @@ class PoolraveMctsagent(RaveMctsagent):
       elif len(white_pool) > 0:
         move = random.choice(white_pool)
         num_pool += 1
-      if random.random() > 0.5 or not move or move not in moves:
-        move = random.choice(moves)
+      if (random.random() > 0.5 or not move or
+          state.get_color(move) != Gamestate.PLAYERS["none"]):
+        move = state.random_move()
         num_pool -= 1
       state.play(move)
-      moves.remove(move)
-
-    black_rave_pts = []
-    white_rave_pts = []
 
     for x in range(state.size):
       for y in range(state.size):
-        if state.board[(x, y)] == Gamestate.PLAYERS["black"]:
-          black_rave_pts.append((x, y))
+        if state.get_color((x, y)) == Gamestate.PLAYERS["black"]:
           if state.winner() == Gamestate.PLAYERS["black"]:
             if (x, y) in self.black_rave:
               self.black_rave[(x, y)] += 1
@@ -79,8 +74,7 @@ class PoolraveMctsagent(RaveMctsagent):
               self.black_rave[(x, y)] -= 1
             else:
               self.black_rave[(x, y)] = -1
-        elif state.board[(x, y)] == Gamestate.PLAYERS["white"]:
-          white_rave_pts.append((x, y))
+        elif state.get_color((x, y)) == Gamestate.PLAYERS["white"]:
           if state.winner() == Gamestate.PLAYERS["white"]:
             if (x, y) in self.white_rave:
               self.white_rave[(x, y)] += 1
@@ -92,4 +86,4 @@ class PoolraveMctsagent(RaveMctsagent):
             else:
               self.white_rave[(x, y)] = -1
 
-    return state.winner(), black_rave_pts, white_rave_pts
\ No newline at end of file
+    return state.winner(), cell_owners(state)
\ No newline at end of file
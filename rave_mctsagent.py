@@ -4,52 +4,156 @@ starter code from Mopyhex at https://github.com/yotomyoto/mopyhex
 """
 from mctsagent import *
 from gamestate import Gamestate
-
-class Rave_Node(Node):
-  
-  def __init__(self, move = None, parent = None):
+from batchrollout import Batchrollout
+from itertools import islice
+from multiprocessing import Pool, Lock as ProcessLock, resource_tracker
+from sharedtree import Sharedtree
+from nodestore import Nodestore
+from endgamesolver import Endgamesolver
+from threading import Lock, Thread
+from math import log
+import numpy as np
+
+def rave_value(N, Q, N_RAVE, Q_RAVE, explore, crit):
+  """
+  Calculate the UCT value of a node relative to its parent from its
+  statistics, the parameter "explore" specifies how much the value should
+  favor nodes that have yet to be thoroughly explored versus nodes that seem
+  to have a high win rate. 
+  Currently explore is set to zero when choosing the best move to play so
+  that the move with the highest winrate is always chossen. When searching
+  explore is set to EXPLORATION specified above.
+  """
+  #unless explore is set to zero, maximally favor unexplored nodes
+  if(N == 0):
+    if(explore == 0):
+      return 0
+    else:
+      return inf
+  else:
+    #rave valuation:
+    alpha = max(0,(crit - N)/crit)
+    return Q*(1-alpha)/N+Q_RAVE*alpha/max(N_RAVE, 1)
+
+def cell_owners(state):
+  """
+  Return the color of every cell of the board of state as an int8 array
+  over cell ids, at the end of a rollout it marks the rave points of each
+  player.
+  """
+  return np.frombuffer(bytes(state.board), dtype=np.int8)
+
+def rave_values(N, Q, N_RAVE, Q_RAVE, explore, crit):
+  """
+  Calculate rave_value for arrays of the statistics of several nodes at once.
+  """
+  values = np.full(len(N), inf if explore else 0.0)
+  visited = N > 0
+  N = N[visited]
+  alpha = np.maximum(0, (crit - N)/crit)
+  values[visited] = (Q[visited]*(1 - alpha)/N +
+                     Q_RAVE[visited]*alpha/np.maximum(N_RAVE[visited], 1))
+  return values
+
+
+class Rave_Node:
+  """
+  View of a node of a Nodestore with the attributes of a search tree node.
+  The statistics are read from the store, so they follow the search, but
+  they are read only.
+  """
+
+  def __init__(self, tree, index, cells, move=None):
     """
-    Initialize a new node with optional move and parent and initially empty
-    children list and rollout statistics and unspecified outcome.
+    Initialize a view of node index of the store tree, cells maps cell ids
+    to the cells of the board and move is the move reaching the node.
     """
+    self.tree = tree
+    self.index = index
+    self.cells = cells
     self.move = move
-    self.parent = parent
-    self.N = 0 #times this position was visited
-    self.Q = 0 #average reward (wins-losses) from this position
-    self.Q_RAVE = 0 # times this move has been critical in a rollout
-    self.N_RAVE = 0 # times this move has appeared in a rollout
-    self.children = {}
-    self.outcome = Gamestate.PLAYERS["none"]
-
-  def add_children(self, children):
-    for child in children:
-      self.children[child.move] = child
+
+  N = property(lambda self: int(self.tree.N[self.index]),
+               doc="times this position was visited")
+  Q = property(lambda self: int(self.tree.Q[self.index]),
+               doc="total reward (wins-losses) from this position")
+  N_RAVE = property(lambda self: int(self.tree.N_RAVE[self.index]),
+                    doc="times this move has appeared in a rollout")
+  Q_RAVE = property(lambda self: int(self.tree.Q_RAVE[self.index]),
+                    doc="times this move has been critical in a rollout")
+  outcome = property(lambda self: int(self.tree.outcome[self.index]),
+                     doc="winner of this position if known for certain")
+
+  @property
+  def parent(self):
+    parent = int(self.tree.parent[self.index])
+    if parent < 0:
+      return None
+    return Rave_Node(self.tree, parent, self.cells)
+
+  @property
+  def children(self):
+    """Dictionary of views of the children keyed by move."""
+    moves, children = self.tree.children(self.index)
+    return {self.cells[move]:
+            Rave_Node(self.tree, child, self.cells, self.cells[move])
+            for move, child in zip(moves.tolist(), children.tolist())}
 
   def value(self, explore, crit):
-    """
-    Calculate the UCT value of this node relative to its parent, the parameter
-    "explore" specifies how much the value should favor nodes that have
-    yet to be thoroughly explored versus nodes that seem to have a high win
-    rate. 
-    Currently explore is set to zero when choosing the best move to play so
-    that the move with the highest winrate is always chossen. When searching
-    explore is set to EXPLORATION specified above.
-    """
-    #unless explore is set to zero, maximally favor unexplored nodes
-    if(self.N == 0):
-      if(explore == 0):
-        return 0
-      else:
-        return inf
-    else:
-      #rave valuation:
-      alpha = max(0,(crit - self.N)/crit)
-      return self.Q*(1-alpha)/self.N+self.Q_RAVE*alpha/self.N_RAVE
+    """Calculate the rave value of this node, see rave_value."""
+    return rave_value(self.N, self.Q, self.N_RAVE, self.Q_RAVE, explore, crit)
 
 
 class RaveMctsagent(Mctsagent):
   RAVE_CONSTANT = 300
   EXPLORATION = 1
+  # number of uniform random playouts simulated together with numpy from each
+  # selected leaf, 1 runs the agent's own roll_out instead
+  BATCH_SIZE = 1
+  # share nodes between move orders reaching the same position, turning the
+  # tree into a directed acyclic graph
+  TRANSPOSITIONS = False
+  # maximum number of positions in the transposition table, when it is full
+  # the least visited of the EVICTION_SAMPLE oldest entries is dropped
+  TABLE_SIZE = 200000
+  EVICTION_SAMPLE = 8
+  # number of threads searching the tree together, every descent counts
+  # VIRTUAL_LOSS lost visits on its path until it is backed up so that the
+  # threads spread over different leaves. The threads descend without
+  # locking, a node is expanded or widened under one of LOCK_STRIPES locks
+  # chosen by its index and the tree has room for NODE_CAPACITY nodes
+  # reserved so that its columns never move during the search
+  THREADS = 1
+  VIRTUAL_LOSS = 1
+  LOCK_STRIPES = 64
+  # with several workers search a single tree in shared memory of at most
+  # NODE_CAPACITY nodes instead of one independent tree per worker, leaves
+  # are no longer expanded once it is full
+  SHARED_TREE = False
+  NODE_CAPACITY = 500000
+  # maximum number of nodes in the tree, 0 for no limit. Leaves other than
+  # the root are no longer expanded once it is reached unless PRUNE_TREE is
+  # set, in which case a search on a single thread drops the children of the
+  # least visited nodes to make room
+  NODE_BUDGET = 0
+  PRUNE_TREE = False
+  # with progressive widening a node below the root starts with children for
+  # WIDEN_INITIAL moves and gets another each time its visits pass
+  # WIDEN_START * WIDEN_FACTOR ** k for the next k. Moves are tried in order
+  # of their rave value two plies up, where the same player is to move. The
+  # shared memory tree is always fully expanded.
+  PROGRESSIVE_WIDENING = False
+  WIDEN_INITIAL = 5
+  WIDEN_START = 10
+  WIDEN_FACTOR = 1.3
+  # positions with at most ENDGAME_CELLS empty cells are solved exactly (see
+  # solve_endgame), 0 always searches
+  ENDGAME_CELLS = 14
+  # every STOP_INTERVAL simulations check whether the most visited root
+  # child could still be overtaken in the time left at the rate the root
+  # has been visited so far, and stop searching if it cannot
+  EARLY_STOP = True
+  STOP_INTERVAL = 200
   
   CASES = {}
   CASE_FIRST = {}
@@ -77,9 +181,82 @@ class RaveMctsagent(Mctsagent):
                    (4, 4)]
   CASE_SINGLE[5] = (2, 2)  
   
-  def __init__(self, state=Gamestate(8)):
+  def __init__(self, state=Gamestate(8), workers=1):
+    """
+    Initialize the agent for the passed state, with workers > 1 each search
+    is run independently in that many processes (see root_parallel_search).
+    """
     self.set_gamestate(state)
     self.short_symetrical = True
+    self.workers = workers
+    self.pool = None
+    self.pool_lock = None
+    self.make_locks()
+    self.fixed_tree = False
+    self.node_budget = self.NODE_BUDGET
+    self.peak_nodes = 0
+    self.pruned_size = 0
+
+  def __getstate__(self):
+    """Leave out the process pool and the locks when pickled for a worker."""
+    state = self.__dict__.copy()
+    state["pool"] = None
+    state["pool_lock"] = None
+    del state["stats_lock"]
+    del state["grow_lock"]
+    del state["node_locks"]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.make_locks()
+
+  def make_locks(self):
+    """
+    Create the locks of the threads searching the tree together: stats_lock
+    guards the statistics and outcomes of every node, grow_lock the
+    allocation of nodes and edges along with the transposition table, and
+    node_locks the expansion and widening of the nodes sharing a stripe.
+    """
+    self.stats_lock = Lock()
+    self.grow_lock = Lock()
+    self.node_locks = [Lock() for i in range(self.LOCK_STRIPES)]
+
+  def node_lock(self, node):
+    """Return the lock guarding the expansion and widening of node."""
+    return self.node_locks[node % self.LOCK_STRIPES]
+
+  @property
+  def root(self):
+    """View of the root of the tree, which is always node 0 of the store."""
+    return Rave_Node(self.tree, 0, self.rootstate.tables.cells)
+
+  def set_workers(self, workers):
+    """
+    Set the number of processes used by search, the process pool is started
+    on the next search and the old one is shut down.
+    """
+    if self.pool is not None:
+      self.pool.terminate()
+      self.pool = None
+    self.workers = workers
+
+  def set_node_budget(self, budget):
+    """Set the maximum number of nodes in the tree, 0 for no limit."""
+    self.node_budget = budget
+
+  def __del__(self):
+    """Shut down the worker processes along with the agent."""
+    if getattr(self, "pool", None) is not None:
+      self.pool.terminate()
+
+  def start_pool(self):
+    """Start the worker processes along with the lock they share."""
+    # workers must inherit the resource tracker, otherwise each one starts
+    # its own which tries to free the shared trees they attach to on exit
+    resource_tracker.ensure_running()
+    self.pool_lock = ProcessLock()
+    self.pool = Pool(self.workers, init_worker, (self.pool_lock,))
   
   def special_case(self, last_move):
     """Return a move found without search, None otherwise."""
@@ -92,169 +269,655 @@ class RaveMctsagent(Mctsagent):
     if(self.rootstate.winner() != Gamestate.PLAYERS["none"]):
       return gamestate.GAMEOVER
 
+    moves, children = self.tree.children(0)
+    if self.SOLVER:
+      #play a proven win right away and avoid proven losses while some move
+      #is not lost yet
+      turn = self.rootstate.turn()
+      outcomes = self.tree.outcome[children]
+      for keep in (outcomes == turn, outcomes != Gamestate.OPPONENT[turn]):
+        if keep.any():
+          moves, children = moves[keep], children[keep]
+          break
+
     #choose the move of the most simulated node breaking ties randomly
-    max_value = max(self.root.children.values(), key = lambda n: n.N).N
-    max_nodes = [n for n in self.root.children.values() if n.N == max_value]
-    bestchild = random.choice(max_nodes)
-    return bestchild.move
+    move = moves[random_argmax(self.tree.N[children])]
+    return self.rootstate.tables.cells[move]
 
   def move(self, move):
     """
     Make the passed move and update the tree approriately.
+    Only the subtree of the move is kept, copied to a new store.
     """
-    if move in self.root.children:
-      child = self.root.children[move]
-      child.parent = None
-      self.root = child
-      self.rootstate.play(child.move)
+    child = self.tree.find_child(0, move[0] * self.rootstate.size + move[1])
+    self.rootstate.play(move)
+    if child >= 0:
+      self.compact_tree(child)
       return
 
     #if for whatever reason the move is not in the children of
     #the root just throw out the tree and start over
-    self.rootstate.play(move)
-    self.root = Rave_Node()
+    self.tree = Nodestore(self.rootstate.size ** 2)
+    self.table = {}
+
+  def solve_endgame(self, time_budget):
+    """
+    Spend up to half of time_budget seconds solving the rootstate exactly
+    with an Endgamesolver, trying moves in order of their rave value at the
+    root of the tree kept from earlier searches. Return a winning move if
+    there is one and the move resisting longest otherwise. If the solver
+    runs out of time search for the rest of time_budget and return None, in
+    which case best_move falls back on the search.
+    """
+    if self.rootstate.winner() != Gamestate.PLAYERS["none"]:
+      return None
+
+    start = time.perf_counter()
+    tree = self.tree
+    moves, children = tree.children(0)
+    priority = np.full(tree.num_cells, -inf)
+    priority[moves] = tree.Q_RAVE[children] / np.maximum(tree.N_RAVE[children],
+                                                         1)
+    result = Endgamesolver(self.rootstate, priority.tolist()).solve(
+      time_budget / 2)
+    if result is not None:
+      self.peak_nodes = len(self.tree)
+      return result[0]
+    self.search(time_budget - (time.perf_counter() - start))
+    return None
+
+  def compact_tree(self, root, min_visits=0):
+    """
+    Replace the tree by a copy holding only root and its descendants, see
+    Nodestore.compact, and remap the transposition table to it.
+    """
+    self.tree, index = self.tree.compact(root, min_visits)
+    self.table = {key: int(index[node]) for key, node in self.table.items()
+                  if index[node] >= 0}
+
+  def prune_tree(self):
+    """
+    When the tree has no room left for another expansion, make room by
+    dropping the children of its least visited nodes, doubling the visits
+    needed to stay expanded until the nodes left fit in half the node
+    budget. Nothing is done if the tree has not grown since it was last
+    pruned, since pruning again would not free anything.
+    """
+    tree = self.tree
+    if (not self.node_budget or
+        len(tree) + tree.num_cells <= self.node_budget or
+        len(tree) <= self.pruned_size):
+      return
+    self.peak_nodes = max(self.peak_nodes, len(tree))
+    N = tree.N[:len(tree)]
+    num_children = tree.num_children[:len(tree)]
+    min_visits = 2
+    while (min_visits <= N[0] and
+           num_children[N >= min_visits].sum() >= self.node_budget // 2):
+      min_visits *= 2
+    self.compact_tree(0, min_visits)
+    self.pruned_size = len(self.tree)
 
   def search(self, time_budget):
     """
     Search and update the search tree for a specified amount of time
-    in secounds.
+    in secounds. The largest number of nodes the tree held is kept in
+    peak_nodes.
     """
-    startTime = time.clock()
-    num_rollouts = 0
+    self.peak_nodes = 0
+    self.pruned_size = 0
+    if self.workers > 1 and self.SHARED_TREE:
+      self.shared_tree_search(time_budget)
+    elif self.workers > 1:
+      self.root_parallel_search(time_budget)
+    elif self.THREADS > 1:
+      self.tree_parallel_search(time_budget)
+    else:
+      self.search_loop(self.rootstate, time_budget, 0)
+    self.peak_nodes = max(self.peak_nodes, len(self.tree))
 
-    #do until we exceed our time budget
-    while(time.clock() - startTime < time_budget):
-      node, state = self.select_node()
+  def search_loop(self, state, time_budget, virtual_loss):
+    """
+    Repeatedly select, simulate and back up from the passed state, which
+    must be the rootstate or a copy of it, for time_budget seconds.
+    """
+    startTime = time.perf_counter()
+    num_rollouts = 0
+    snapshot = state.snapshot()
+    if self.BATCH_SIZE > 1:
+      batch = Batchrollout(self.BATCH_SIZE, random.getrandbits(32))
+    start_visits = self.tree.N[0]
+    next_check = self.STOP_INTERVAL
+
+    #do until we exceed our time budget or the game is solved
+    while(time.perf_counter() - startTime < time_budget and
+          not self.root_proven()):
+      if self.EARLY_STOP and num_rollouts >= next_check:
+        next_check = num_rollouts + self.STOP_INTERVAL
+        elapsed = time.perf_counter() - startTime
+        if self.best_move_settled(start_visits, elapsed, time_budget):
+          break
+      #the indices of the nodes change when pruning, so only a single
+      #thread can do it
+      if self.PRUNE_TREE and self.THREADS == 1:
+        self.prune_tree()
+      path, state = self.select_node(state, virtual_loss)
       turn = state.turn()
-      outcome, black_rave_pts, white_rave_pts = self.roll_out(state)
-      self.backup(node, turn, outcome, black_rave_pts, white_rave_pts)
-      num_rollouts += 1
+      if self.BATCH_SIZE > 1:
+        results = self.batch_roll_out(state, batch)
+      else:
+        results = [self.roll_out(state)]
+      with self.stats_lock:
+        for outcome, owner in results:
+          self.backup(path, turn, outcome, owner)
+        if virtual_loss:
+          self.add_virtual_loss(path[1:], -virtual_loss)
+      state.restore(snapshot)
+      num_rollouts += len(results)
 
     #stderr.write("Ran "+str(num_rollouts)+ " rollouts in " +\
-    #  str(time.clock() - startTime)+" sec\n")
+    #  str(time.perf_counter() - startTime)+" sec\n")
     #stderr.write("Node count: "+str(self.tree_size())+"\n")
 
-  def select_node(self):
+  def best_move_settled(self, start_visits, elapsed, time_budget):
     """
-    Select a node in the tree to preform a single simulation from.
+    Return True if the most visited root child would stay ahead even if
+    every visit to the root in the rest of time_budget went to the second
+    most visited, at the rate the root went from start_visits visits in the
+    elapsed seconds. A single legal move is always settled.
     """
-    node = self.root
-    state = deepcopy(self.rootstate)
+    tree = self.tree
+    if tree.num_children[0] == 1:
+      return True
+    visits = tree.N[0] - start_visits
+    if visits <= 0 or tree.num_children[0] < 2:
+      return False
+    remaining = visits / elapsed * (time_budget - elapsed)
+    N = np.partition(tree.N[tree.children(0)[1]], -2)
+    return N[-1] - N[-2] > remaining
+
+  def tree_parallel_search(self, time_budget):
+    """
+    Search the tree from THREADS threads at once, each one descending on its
+    own copy of the rootstate with virtual loss. Room for the node budget, or
+    NODE_CAPACITY nodes without one, is reserved first and leaves are no
+    longer expanded once it is used up.
+    """
+    capacity = (self.node_budget or self.NODE_CAPACITY) + self.tree.num_cells
+    self.tree.reserve(capacity, 4 * capacity)
+    self.fixed_tree = True
+    threads = [Thread(target=self.search_loop,
+                      args=(self.rootstate.clone(), time_budget,
+                            self.VIRTUAL_LOSS))
+               for i in range(self.THREADS)]
+    try:
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    finally:
+      self.fixed_tree = False
+
+  def add_virtual_loss(self, nodes, loss):
+    """
+    Count loss lost visits, or take them back if negative, on a node or
+    every node of a list. The caller must hold the statistics lock.
+    """
+    tree = self.tree
+    tree.N[nodes] += loss
+    tree.Q[nodes] -= loss
+    tree.N_RAVE[nodes] += loss
+    tree.Q_RAVE[nodes] -= loss
+
+  def root_parallel_search(self, time_budget):
+    """
+    Run an independent search from the rootstate in each worker process and
+    replace the tree by a root whose children sum the statistics of the
+    workers' root children.
+    Every worker searches a copy of this agent, including any rollout policy
+    state, with an empty tree and its own random seed.
+    """
+    if self.pool is None:
+      self.start_pool()
+    worker = copy(self)
+    worker.workers = 1
+    worker.tree = Nodestore(self.rootstate.size ** 2)
+    worker.table = {}
+    seed = random.getrandbits(32)
+    jobs = [(worker, time_budget, seed + i) for i in range(self.workers)]
+    results = self.pool.starmap(root_search, jobs)
+
+    self.tree = Nodestore(self.rootstate.size ** 2)
+    self.table = {}
+    self.expand(0, self.rootstate)
+    for stats, peak_nodes in results:
+      self.add_root_stats(stats)
+      self.peak_nodes = max(self.peak_nodes, peak_nodes)
+
+  def add_root_stats(self, stats):
+    """
+    Add a dictionary of (N, Q, N_RAVE, Q_RAVE) keyed by cell id to the
+    statistics of the root's children, skipping moves the root has no child
+    for.
+    """
+    tree = self.tree
+    for move, (N, Q, N_RAVE, Q_RAVE) in stats.items():
+      child = tree.find_child(0, move)
+      if child < 0:
+        continue
+      tree.N[child] += N
+      tree.Q[child] += Q
+      tree.N_RAVE[child] += N_RAVE
+      tree.Q_RAVE[child] += Q_RAVE
+      tree.N[0] += N
+
+  def shared_tree_search(self, time_budget):
+    """
+    Search a single tree in shared memory from every worker process with
+    virtual loss, then replace the tree by a root holding the statistics of
+    the shared root's children.
+    """
+    if self.pool is None:
+      self.start_pool()
+    #the root must always fit its children
+    capacity = max(self.node_budget or self.NODE_CAPACITY,
+                   self.rootstate.size ** 2 + 1)
+    tree = Sharedtree(capacity, self.workers, self.pool_lock)
+    try:
+      worker = copy(self)
+      worker.tree = Nodestore(self.rootstate.size ** 2)
+      worker.table = {}
+      seed = random.getrandbits(32)
+      jobs = [(worker, capacity, tree.name, row, time_budget, seed + row)
+              for row in range(self.workers)]
+      self.pool.starmap(shared_search, jobs)
+
+      self.tree = Nodestore(self.rootstate.size ** 2)
+      self.table = {}
+      self.expand(0, self.rootstate)
+      self.add_root_stats(tree.root_stats())
+      self.peak_nodes = tree.size()
+    finally:
+      tree.close()
+      tree.unlink()
+
+  def shared_search_loop(self, tree, row, time_budget):
+    """
+    Repeatedly select, simulate and back up in the shared tree for
+    time_budget seconds, writing to the passed row of its statistics.
+    """
+    startTime = time.perf_counter()
+    state = self.rootstate
+    snapshot = state.snapshot()
+    cells = state.tables.cells
+    if self.BATCH_SIZE > 1:
+      batch = Batchrollout(self.BATCH_SIZE, random.getrandbits(32))
+
+    while(time.perf_counter() - startTime < time_budget):
+      node = 0
+      path = [node]
+      while True:
+        #expand leaves until the tree is full, another process may have
+        #expanded the node already. Unvisited children all have an infinite
+        #value so the first one is chosen at random.
+        if tree.num_children[node] == 0:
+          if (state.winner() != Gamestate.PLAYERS["none"] or
+              not tree.expand(node, self.child_moves(node, state))):
+            break
+        node = tree.select(node, self.EXPLORATION, self.RAVE_CONSTANT)
+        #count the virtual loss on each node as soon as it is chosen so that
+        #the other processes see it while this one descends further
+        unvisited = tree.visits(node) == 0
+        tree.add_virtual_loss(row, node, self.VIRTUAL_LOSS)
+        state.play(cells[tree.move[node]])
+        path.append(node)
+        if unvisited:
+          break
+
+      turn = state.turn()
+      if self.BATCH_SIZE > 1:
+        results = self.batch_roll_out(state, batch)
+      else:
+        results = [self.roll_out(state)]
+      for outcome, owner in results:
+        reward = -1 if outcome == turn else 1
+        tree.backup(row, path, turn, reward, owner, Gamestate.OPPONENT[turn])
+      tree.add_virtual_loss(row, path[1:], -self.VIRTUAL_LOSS)
+      state.restore(snapshot)
+
+  def select_node(self, state=None, virtual_loss=0):
+    """
+    Select a node in the tree to preform a single simulation from and return
+    the path of nodes leading to it from the root.
+    The moves are played directly on the passed state, by default the
+    rootstate, the caller is responsible for restoring it once the
+    simulation is backed up and for taking back any virtual loss added to
+    the path. The virtual loss is added to each node as soon as it is
+    chosen, so other threads see it while this one descends further.
+    Children are played by the move of the edge leading to them since with
+    transpositions a node can be reached by several moves.
+    The descent takes no lock, it only reads the statistics and the edge
+    blocks are published complete (see Nodestore).
+    """
+    node = 0
+    if state is None:
+      state = self.rootstate
+    cells = state.tables.cells
+    tree = self.tree
+    path = [node]
+
+    while True:
+      #if we reach a leaf node generate its children and return one of
+      #them if the node is terminal, just return the terminal node.
+      #Another thread may have expanded it in the meantime.
+      if tree.num_children[node] == 0:
+        if not self.expand(node, state):
+          break
+        moves, children = tree.children(node)
+        best = random.randrange(len(children))
+        node = int(children[best])
+        state.play(cells[moves[best]])
+        path.append(node)
+        if virtual_loss:
+          with self.stats_lock:
+            self.add_virtual_loss(node, virtual_loss)
+        break
+
+      if self.PROGRESSIVE_WIDENING:
+        self.widen(node, state)
 
-    #stop if we reach a leaf node
-    while(len(node.children) != 0):
-      max_node = max(node.children.values(),
-                     key=lambda n: n.value(self.EXPLORATION, self.RAVE_CONSTANT))
-      
-      max_value = max_node.value(self.EXPLORATION, self.RAVE_CONSTANT)
       #decend to the maximum value node, break ties at random
-      max_nodes = [n for n in node.children.values() if 
-                   n.value(self.EXPLORATION, self.RAVE_CONSTANT) == max_value]
-      node = random.choice(max_nodes)
-      state.play(node.move)
+      moves, children = tree.children(node)
+      values = rave_values(tree.N[children], tree.Q[children],
+                           tree.N_RAVE[children], tree.Q_RAVE[children],
+                           self.EXPLORATION, self.RAVE_CONSTANT)
+      if self.SOLVER:
+        #skip the moves proven to lose, if they all do simulate from here
+        lost = tree.outcome[children] == Gamestate.OPPONENT[state.turn()]
+        if lost.all():
+          break
+        values[lost] = -inf
+      best = random_argmax(values)
+      node = int(children[best])
+      state.play(cells[moves[best]])
+      path.append(node)
 
       #if some child node has not been explored select it
       #before expanding other children
-      if node.N == 0:
-        return (node, state)
+      unvisited = tree.N[node] == 0
+      if virtual_loss:
+        with self.stats_lock:
+          self.add_virtual_loss(node, virtual_loss)
+      if unvisited:
+        break
 
-    #if we reach a leaf node generate its children and return one of
-    #them if the node is terminal, just return the terminal node
-    if(self.expand(node, state)):
-      node = random.choice(list(node.children.values()))
-      state.play(node.move)
-    return (node, state)
+    return (path, state)
 
-  def backup(self, node, turn, outcome, black_rave_pts, white_rave_pts):
+  def backup(self, path, turn, outcome, owner):
     """
-    Update the node statistics on the path from the passed node to
-    root to reflect the outcome of a randomly simulated playout.
+    Update the node statistics on the passed path from the root to reflect
+    the outcome of a randomly simulated playout, where owner holds the color
+    of every cell at the end of the playout (see cell_owners). Only the path
+    actually traversed is updated, even when a node has several parents.
+    With the solver, outcomes proven below are passed up the path (see
+    prove). While searching with threads the caller must hold the statistics
+    lock.
     """
     # note that reward is calculated for player who just played
     # at the node and not the next player to play
     reward = -1 if outcome == turn else 1
 
-    while node != None:
-      if turn == Gamestate.PLAYERS["white"]:
-        for point in white_rave_pts:
-          if point in node.children:
-            node.children[point].Q_RAVE += -reward
-            node.children[point].N_RAVE += 1
-      else:
-        for point in black_rave_pts:
-          if point in node.children:
-            node.children[point].Q_RAVE += -reward
-            node.children[point].N_RAVE += 1
-
-      node.N += 1
-      node.Q += reward
+    rave_masks = {Gamestate.PLAYERS["white"]:
+                  owner == Gamestate.PLAYERS["white"],
+                  Gamestate.PLAYERS["black"]:
+                  owner == Gamestate.PLAYERS["black"]}
+
+    tree = self.tree
+    #a node can only become proven if the node below it on the path is
+    proven = self.SOLVER
+    for node in reversed(path):
+      if tree.num_children[node] != 0:
+        moves, children = tree.children(node)
+        children = children[rave_masks[turn][moves]]
+        tree.Q_RAVE[children] -= reward
+        tree.N_RAVE[children] += 1
+
+      tree.N[node] += 1
+      tree.Q[node] += reward
+      if proven and tree.outcome[node] == Gamestate.PLAYERS["none"]:
+        self.prove(node, turn)
+      proven = tree.outcome[node] != Gamestate.PLAYERS["none"]
       if turn == Gamestate.PLAYERS["black"]:
         turn = Gamestate.PLAYERS["white"]
       else:
         turn = Gamestate.PLAYERS["black"]
       reward = -reward
-      node = node.parent
+
+  def prove(self, node, turn):
+    """
+    Mark node, where turn is to move, as won for turn if one of its children
+    is and as lost if it has a child for every move it was expanded with
+    (see child_moves) and all of them are won for the opponent.
+    """
+    tree = self.tree
+    outcomes = tree.outcome[tree.children(node)[1]]
+    if len(outcomes) == 0:
+      return
+    if (outcomes == turn).any():
+      tree.outcome[node] = turn
+    elif (len(outcomes) == tree.num_moves[node] and
+          (outcomes == Gamestate.OPPONENT[turn]).all()):
+      tree.outcome[node] = Gamestate.OPPONENT[turn]
 
   def expand(self, parent, state):
     """
     Generate the children of the passed "parent" node based on the available
     moves in the passed gamestate and add them to the tree.
+    With transpositions enabled children whose position is already in the
+    table are shared instead of created again. With progressive widening
+    nodes below the root only get children for their WIDEN_INITIAL best
+    moves (see widen). Return False if the node is terminal or the children
+    would not fit in the node budget, which the root is exempt from so that
+    there is always a move to choose from. Return True without doing
+    anything if another thread expanded the node first.
     """
-    children = []
     if(state.winner() != Gamestate.PLAYERS["none"]): 
       #game is over at this node so nothing to expand
+      if self.SOLVER:
+        self.tree.outcome[parent] = state.winner()
       return False
 
-    for move in state.moves():
-      children.append(Rave_Node(move, parent))
-
-    parent.add_children(children)
+    with self.node_lock(parent):
+      if self.tree.num_children[parent] != 0:
+        return True
+      moves = self.child_moves(parent, state)
+      num_moves = room = len(moves)
+      if self.PROGRESSIVE_WIDENING and parent != 0:
+        moves = self.widening_order(parent, moves)[:self.WIDEN_INITIAL]
+        room = 2 * len(moves)
+
+      with self.grow_lock:
+        if not self.has_room(parent, len(moves), room):
+          #the tree is full, keep simulating from this leaf
+          return False
+        children = self.make_children(parent, state, moves)
+        self.tree.num_moves[parent] = num_moves
+        self.tree.set_children(parent, moves, children, room)
     return True
 
+  def has_room(self, parent, nodes, edges):
+    """
+    Return True if nodes more nodes and edges more edges for the children of
+    parent fit in the node budget, which the root is exempt from, and in the
+    room reserved for threads searching together.
+    """
+    tree = self.tree
+    if (self.node_budget and parent != 0 and
+        len(tree) + nodes > self.node_budget):
+      return False
+    return not self.fixed_tree or tree.has_room(nodes, edges)
+
+  def child_moves(self, node, state):
+    """
+    Return a list of the cell ids of the moves node, whose position is
+    state, gets children for, every empty cell.
+    """
+    return list(state.empty)
+
+  def make_children(self, parent, state, moves):
+    """
+    Return a list of the nodes reached from parent by the passed cell ids,
+    adding them to the tree unless they are found in the transposition
+    table. While searching with threads the caller must hold the grow lock.
+    """
+    tree = self.tree
+    if not self.TRANSPOSITIONS:
+      first = tree.add_nodes(parent, len(moves))
+      return range(first, first + len(moves))
+
+    cells = state.tables.cells
+    children = []
+    for move in moves:
+      key = state.play_hash(cells[move])
+      child = self.table.get(key)
+      if child is None:
+        child = tree.add_nodes(parent, 1)
+        self.remember(key, child)
+      children.append(child)
+    return children
+
+  def widening_order(self, node, moves):
+    """
+    Return the passed cell ids in the order progressive widening adds them
+    to node, by decreasing rave value of the same move from the node two
+    plies up, which has the same player to move, ties in random order.
+    Moves it has no child for come last.
+    """
+    tree = self.tree
+    moves = list(moves)
+    random.shuffle(moves)
+    moves = np.array(moves, dtype=np.intp)
+    values = np.full(len(moves), -inf)
+    parent = tree.parent[node]
+    grandparent = tree.parent[parent] if parent >= 0 else -1
+    if grandparent >= 0:
+      lookup = np.full(tree.num_cells, -1, dtype=np.intp)
+      known, children = tree.children(grandparent)
+      lookup[known] = children
+      children = lookup[moves]
+      found = children >= 0
+      children = children[found]
+      values[found] = tree.Q_RAVE[children] / np.maximum(tree.N_RAVE[children],
+                                                         1)
+    return moves[np.argsort(-values, kind="stable")].tolist()
+
+  def widen(self, node, state):
+    """
+    Give node, whose position is state, children for more of its moves until
+    it has as many as its visits allow, the root gets every move. Nothing is
+    done once the node has a child for every move it was expanded with.
+    """
+    tree = self.tree
+    if tree.num_children[node] >= tree.num_moves[node]:
+      return
+    if node == 0:
+      allowed = tree.num_moves[node]
+    elif tree.N[node] < self.WIDEN_START:
+      allowed = self.WIDEN_INITIAL
+    else:
+      allowed = (self.WIDEN_INITIAL + 1 +
+                 int(log(tree.N[node] / self.WIDEN_START) /
+                     log(self.WIDEN_FACTOR)))
+    if self.SOLVER:
+      #moves proven to lose do not count against the allowance
+      lost = tree.outcome[tree.children(node)[1]]
+      allowed += np.count_nonzero(lost == Gamestate.OPPONENT[state.turn()])
+    if allowed <= tree.num_children[node]:
+      return
+
+    #another thread may have widened the node in the meantime
+    with self.node_lock(node):
+      missing = allowed - tree.num_children[node]
+      if missing <= 0:
+        return
+      tried = set(tree.children(node)[0].tolist())
+      moves = [move for move in self.child_moves(node, state)
+               if move not in tried]
+      if node != 0:
+        moves = self.widening_order(node, moves)
+      moves = moves[:missing]
+      with self.grow_lock:
+        #moving the block of the node may take twice its edges
+        if not self.has_room(node, len(moves),
+                             2 * (tree.num_children[node] + len(moves))):
+          return
+        for move, child in zip(moves,
+                               self.make_children(node, state, moves)):
+          tree.add_child(node, move, child)
+
+  def remember(self, key, node):
+    """
+    Add a node to the transposition table under the hash of its position.
+    When the table is full the least visited of the oldest few entries is
+    dropped, its node stays in the tree but can no longer be shared.
+    """
+    if len(self.table) >= self.TABLE_SIZE:
+      oldest = list(islice(self.table.items(), self.EVICTION_SAMPLE))
+      victim = min(oldest, key=lambda item: self.tree.N[item[1]])[0]
+      for old_key, old_node in oldest:
+        del self.table[old_key]
+        if old_key != victim:
+          self.table[old_key] = old_node
+    self.table[key] = node
+
   def set_gamestate(self, state):
     """
     Set the rootstate of the tree to the passed gamestate, this clears all the
     information stored in the tree since none of it applies to the new state.
     """
-    self.rootstate = deepcopy(state)
-    self.root = Rave_Node()
+    self.rootstate = state.clone()
+    self.tree = Nodestore(self.rootstate.size ** 2)
+    self.table = {}
 
   def roll_out(self, state):
     """
     Simulate a random game except that we play all known critical
     cells first, return the winning player and record critical cells at the end.
     """
-    moves = state.moves()
-    
+    if self.FILL_ROLLOUTS:
+      return self.fill_roll_out(state)
+
     while(state.winner() == Gamestate.PLAYERS["none"]):
-      move = random.choice(moves)
-      state.play(move)
-      moves.remove(move)
+      state.play(state.random_move())
 
-    black_rave_pts = []
-    white_rave_pts = []
+    return state.winner(), cell_owners(state)
 
-    for x in range(state.size):
-      for y in range(state.size):
-        if state.board[(x,y)] == Gamestate.PLAYERS["black"]:
-          black_rave_pts.append((x,y))
-        elif state.board[(x,y)] == Gamestate.PLAYERS["white"]:
-          white_rave_pts.append((x,y))
+  def fill_roll_out(self, state):
+    """
+    Simulate a random game by filling every empty cell at once and checking
+    the winner a single time at the end. Every cell of the filled board counts
+    as a rave point of its color.
+    """
+    board = state.random_fill()
+    return (state.filled_winner(board),
+            np.frombuffer(bytes(board), dtype=np.int8))
 
-    return state.winner(), black_rave_pts, white_rave_pts
+  def batch_roll_out(self, state, batch):
+    """
+    Simulate a batch of uniform random games with the passed Batchrollout and
+    return a list of (winner, owner) for each of them, owner being the filled
+    board.
+    """
+    winners, boards = batch.roll_out(state)
+    return list(zip(winners.tolist(), boards))
 
   def tree_size(self):
-    """Count nodes in tree by BFS."""
-    Q = Queue()
-    count = 0
-    Q.put(self.root)
-    while not Q.empty():
-      node = Q.get()
-      count += 1
-      for child in node.children.values():
-        Q.put(child)
-    return count  
-  
+    """
+    Count nodes in tree, the store only holds nodes under the root and
+    nodes shared through transpositions are stored once.
+    """
+    return len(self.tree)
+
   def get_small_board_move(self, last_move, size, moves):
     """
     Return special case moves on 5x5 or smaller boards.
@@ -312,4 +975,40 @@ class RaveMctsagent(Mctsagent):
           and self.short_symetrical):
         return short_diagonal_reflect
       
-    return None
\ No newline at end of file
+    return None
+
+
+def root_search(agent, time_budget, seed):
+  """
+  Search with a worker's copy of an agent and return the statistics of its
+  root children as a dictionary of (N, Q, N_RAVE, Q_RAVE) keyed by cell id,
+  along with the peak size of its tree.
+  """
+  random.seed(seed)
+  agent.search(time_budget)
+  tree = agent.tree
+  stats = {}
+  moves, children = tree.children(0)
+  for move, child in zip(moves.tolist(), children.tolist()):
+    stats[move] = (int(tree.N[child]), int(tree.Q[child]),
+                   int(tree.N_RAVE[child]), int(tree.Q_RAVE[child]))
+  return stats, agent.peak_nodes
+
+
+def init_worker(lock):
+  """Keep the lock shared by the pool's processes for use by their searches."""
+  global worker_lock
+  worker_lock = lock
+
+
+def shared_search(agent, capacity, name, row, time_budget, seed):
+  """
+  Search the shared tree of the passed capacity called name with a worker's
+  copy of an agent, writing to the passed row of its statistics.
+  """
+  random.seed(seed)
+  tree = Sharedtree(capacity, agent.workers, worker_lock, name)
+  try:
+    agent.shared_search_loop(tree, row, time_budget)
+  finally:
+    tree.close()
@@ -0,0 +1,162 @@
+"""
+Search tree kept in fixed size arrays in shared memory so that several
+processes can select, expand and back up in a single tree.
+"""
+from multiprocessing import shared_memory
+import random
+import numpy as np
+
+class Sharedtree:
+  """
+  Tree of at most capacity nodes identified by index, the root is node 0.
+  Every node stores the cell id of the move leading to it, its parent and the
+  index and number of its children, which are allocated contiguously when the
+  node is expanded.
+  The statistics N, Q, N_RAVE and Q_RAVE of each node are kept in one row per
+  process so that a process only ever writes to its own row, the value of a
+  statistic is the sum over the rows. Only expansion takes the shared lock.
+  """
+  N = 0
+  Q = 1
+  N_RAVE = 2
+  Q_RAVE = 3
+
+  def __init__(self, capacity, rows, lock, name=None):
+    """
+    Create a tree holding just the root or, if name is given, attach to the
+    tree created under that name by another process. The lock must be the
+    same for every process using the tree.
+    """
+    size = 8 + 16 * capacity + 32 * rows * capacity
+    if name is None:
+      self.memory = shared_memory.SharedMemory(create=True, size=size)
+    else:
+      self.memory = shared_memory.SharedMemory(name=name)
+    self.capacity = capacity
+    self.lock = lock
+
+    buf = self.memory.buf
+    self.count = np.ndarray(1, np.int64, buf, 0)
+    offset = 8
+    self.move = np.ndarray(capacity, np.int32, buf, offset)
+    offset += 4 * capacity
+    self.parent = np.ndarray(capacity, np.int32, buf, offset)
+    offset += 4 * capacity
+    self.first_child = np.ndarray(capacity, np.int32, buf, offset)
+    offset += 4 * capacity
+    self.num_children = np.ndarray(capacity, np.int32, buf, offset)
+    offset += 4 * capacity
+    self.stats = np.ndarray((4, rows, capacity), np.float64, buf, offset)
+
+    if name is None:
+      # new shared memory is zero filled, only the root needs setting up
+      self.move[0] = -1
+      self.parent[0] = -1
+      self.count[0] = 1
+
+  @property
+  def name(self):
+    """Name other processes attach to the tree with."""
+    return self.memory.name
+
+  def close(self):
+    """Detach this process from the tree, the unlink frees it for good."""
+    del self.count, self.move, self.parent, self.first_child
+    del self.num_children, self.stats
+    self.memory.close()
+
+  def unlink(self):
+    """Free the shared memory once every process has closed the tree."""
+    self.memory.unlink()
+
+  def size(self):
+    """Return the number of nodes in the tree."""
+    return int(self.count[0])
+
+  def visits(self, node):
+    """Return the N of node summed over the rows."""
+    return self.stats[self.N, :, node].sum()
+
+  def expand(self, node, moves):
+    """
+    Add a child for each cell id in moves to node unless another process
+    already expanded it. Return False if there is no room left for the
+    children, in which case node stays a leaf.
+    The number of children is written last so that readers never see a
+    partially built block.
+    """
+    with self.lock:
+      if self.num_children[node] != 0:
+        return True
+      first = int(self.count[0])
+      if first + len(moves) > self.capacity:
+        return False
+      self.count[0] = first + len(moves)
+      self.move[first:first + len(moves)] = moves
+      self.parent[first:first + len(moves)] = node
+      self.first_child[first:first + len(moves)] = 0
+      self.num_children[first:first + len(moves)] = 0
+      self.stats[:, :, first:first + len(moves)] = 0
+      self.first_child[node] = first
+      self.num_children[node] = len(moves)
+    return True
+
+  def select(self, node, explore, crit):
+    """
+    Return the child of node with the highest rave value (see
+    Rave_Node.value), breaking ties randomly.
+    """
+    first = self.first_child[node]
+    end = first + self.num_children[node]
+    N, Q, N_RAVE, Q_RAVE = self.stats[:, :, first:end].sum(axis=1)
+    visited = N > 0
+    if explore == 0:
+      values = np.zeros(len(N))
+    else:
+      values = np.full(len(N), np.inf)
+    alpha = np.maximum(0, (crit - N[visited]) / crit)
+    values[visited] = (Q[visited] * (1 - alpha) / N[visited] +
+                       Q_RAVE[visited] * alpha /
+                       np.maximum(N_RAVE[visited], 1))
+    best = np.flatnonzero(values == values.max())
+    return first + int(random.choice(best))
+
+  def add_virtual_loss(self, row, nodes, loss):
+    """Count loss lost visits in row for a node or every node of a list."""
+    self.stats[self.N, row, nodes] += loss
+    self.stats[self.Q, row, nodes] -= loss
+    self.stats[self.N_RAVE, row, nodes] += loss
+    self.stats[self.Q_RAVE, row, nodes] -= loss
+
+  def backup(self, row, path, turn, reward, owner, other):
+    """
+    Update row of the statistics of the path from the root to reflect a
+    playout, as RaveMctsagent.backup does. reward is that of the player who
+    moved into the last node of the path and owner holds the color of every
+    cell at the end of the playout. turn is the player to move at the last
+    node and other its opponent.
+    """
+    stats = self.stats
+    for node in reversed(path):
+      first = self.first_child[node]
+      end = first + self.num_children[node]
+      if end > first:
+        rave = owner[self.move[first:end]] == turn
+        stats[self.N_RAVE, row, first:end] += rave
+        stats[self.Q_RAVE, row, first:end] -= reward * rave
+      stats[self.N, row, node] += 1
+      stats[self.Q, row, node] += reward
+      turn, other = other, turn
+      reward = -reward
+
+  def root_stats(self):
+    """
+    Return a dictionary of the summed (N, Q, N_RAVE, Q_RAVE) of the root's
+    children keyed by cell id.
+    """
+    first = self.first_child[0]
+    end = first + self.num_children[0]
+    N, Q, N_RAVE, Q_RAVE = self.stats[:, :, first:end].sum(axis=1)
+    return {int(self.move[first + i]):
+            (int(N[i]), int(Q[i]), int(N_RAVE[i]), int(Q_RAVE[i]))
+            for i in range(end - first)}
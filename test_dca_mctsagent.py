@@ -0,0 +1,27 @@
+"""
+Tests of the dead cell analysis of DCAMctsagent.
+"""
+import random
+import pytest
+from gamestate import Gamestate
+from dca_mctsagent import DCAMctsagent
+
+@pytest.mark.parametrize("size", [9, 13])
+def test_incremental_dead_cells(size):
+  """
+  The incremental analysis, which only analyzes the groups changed by a
+  move, finds the same dead cells along random games as an analysis of
+  every group of the position.
+  """
+  rng = random.Random(size)
+  for game in range(4):
+    agent = DCAMctsagent(Gamestate(size))
+    state = agent.rootstate
+    while state.winner() == Gamestate.PLAYERS["none"]:
+      before = set(agent.dead)
+      agent.findDeadRegions()
+      reference = DCAMctsagent(state)
+      reference.dead = before
+      reference.findDeadRegions()
+      assert agent.dead == reference.dead, state.num_played
+      agent.move(rng.choice(state.moves()))
@@ -0,0 +1,32 @@
+"""
+Tests of Endgamesolver against minimax.
+"""
+import random
+import pytest
+from endgamesolver import Endgamesolver
+from testutil import open_positions, minimax
+
+@pytest.mark.parametrize("size", [5, 7])
+def test_solver_agrees_with_minimax(size):
+  """
+  A won position is found won with a winning move, the null window search
+  only giving a bound on its score, and a lost one gets its exact score
+  and a move holding out that long.
+  """
+  rng = random.Random(size)
+  table = {}
+  for state in open_positions(size, 9, 10, size):
+    priority = [rng.random() for index in range(size * size)]
+    cell, score = Endgamesolver(state, priority).solve(float("inf"))
+    state = state.clone()
+    exact = minimax(state, table)
+    if exact > 0:
+      assert score > 0
+    else:
+      assert score == exact
+    state.play(cell)
+    reached = -minimax(state, table)
+    if exact > 0:
+      assert reached > 0
+    else:
+      assert reached == exact
@@ -0,0 +1,134 @@
+"""
+Tests of Gamestate against clones and plain searches of the board.
+"""
+import random
+from gamestate import Gamestate
+
+def state_difference(state, other):
+  """
+  Return the name of the first part of state that differs from other, None
+  if they are the same position with the same history.
+  """
+  for name in ("board", "toplay", "num_played", "hash", "trail"):
+    if getattr(state, name) != getattr(other, name):
+      return name
+  if sorted(state.empty) != sorted(other.empty):
+    return "empty"
+  if any(state.empty.items[state.empty.pos[index]] != index
+         for index in range(state.size ** 2)):
+    return "empty positions"
+  for name in ("white_groups", "black_groups"):
+    groups = getattr(state, name)
+    other_groups = getattr(other, name)
+    for column in ("parent", "rank", "next", "history"):
+      if getattr(groups, column) != getattr(other_groups, column):
+        return name + " " + column
+  #bring copies of the codes of rings up to date, so that the states keep
+  #any stones they have yet to follow
+  if state.clone().sync_rings() != other.clone().sync_rings():
+    return "rings"
+  return None
+
+def test_undo_and_restore():
+  """
+  Undo and restore to earlier snapshots bring back the union find
+  structures, the empty cells and the rest of the position exactly as a
+  clone taken at every stone through random plays, undos and restores.
+  """
+  rng = random.Random(9)
+  for game in range(30):
+    state = Gamestate(9)
+    history = [state.clone()]
+    for step in range(200):
+      action = rng.random()
+      if action < 0.6 and state.winner() == Gamestate.PLAYERS["none"]:
+        state.play(rng.choice(state.moves()))
+        history.append(state.clone())
+      elif action < 0.8 and len(history) > 1:
+        state.undo()
+        history.pop()
+      elif len(history) > 1:
+        snapshot = rng.randrange(len(history))
+        state.restore(snapshot)
+        del history[snapshot + 1:]
+      if action < 0.1:
+        state.sync_rings()
+      assert state_difference(state, history[-1]) is None, (game, step)
+
+def search_reachable(state, colors, stopset, start):
+  """
+  Return the cells Gamestate.reachable should find, searched breadth first
+  from cell to cell.
+  """
+  if start in (Gamestate.EDGE1, Gamestate.EDGE2):
+    side = 0 if start == Gamestate.EDGE1 else 1
+    frontier = [cell for cell in state.tables.edge_neighbors[colors[0]][side]
+                if state.get_color(cell) in colors]
+  else:
+    frontier = [start]
+  seen = set(frontier)
+  seen.add(start)
+  while frontier:
+    cell = frontier.pop()
+    if cell in stopset:
+      continue
+    for nb in state.neighbors(cell):
+      if nb not in seen and state.get_color(nb) in colors:
+        seen.add(nb)
+        frontier.append(nb)
+  return seen
+
+def test_reachable():
+  """
+  The bit mask flood fill of reachable finds the same cells as a breadth
+  first search, from both edges and from single cells, with random stop
+  sets on positions filled to random degrees.
+  """
+  for size in (5, 9, 13):
+    rng = random.Random(size)
+    cells = list(Gamestate(size).tables.cells)
+    for position in range(50):
+      state = Gamestate(size)
+      for cell in rng.sample(cells, rng.randrange(len(cells))):
+        state.play(cell)
+      for color in (Gamestate.PLAYERS["white"], Gamestate.PLAYERS["black"]):
+        colors = [color, Gamestate.PLAYERS["none"]]
+        stopset = set(rng.sample(cells, rng.randrange(len(cells) + 1)))
+        for start in (Gamestate.EDGE1, Gamestate.EDGE2, rng.choice(cells)):
+          assert (state.reachable(colors, stopset, start) ==
+                  search_reachable(state, colors, stopset, start))
+
+def test_vulnerable_cells():
+  """
+  The cells found vulnerable to a color by the ring pattern table are the
+  empty cells that are not dead but are found dead once that color is
+  placed on one of their empty neighbors.
+  """
+  place = {Gamestate.PLAYERS["white"]: Gamestate.place_white,
+           Gamestate.PLAYERS["black"]: Gamestate.place_black}
+  vulnerable = 0
+  for size in (3, 5, 9):
+    rng = random.Random(size)
+    cells = list(Gamestate(size).tables.cells)
+    for position in range(50):
+      state = Gamestate(size)
+      for cell in rng.sample(cells, rng.randrange(len(cells))):
+        state.play(cell)
+      dead = set(state.dead_cells().tolist())
+      for color, place_color in place.items():
+        expected = set()
+        for index in state.empty:
+          if index in dead:
+            continue
+          for nb in state.tables.neighbor_ids[index]:
+            if state.board[nb] != Gamestate.PLAYERS["none"]:
+              continue
+            place_color(state, cells[nb])
+            found = index in state.dead_cells().tolist()
+            state.undo()
+            if found:
+              expected.add(index)
+              break
+        assert set(state.vulnerable_cells(color).tolist()) == expected
+        vulnerable += len(expected)
+  assert vulnerable > 0
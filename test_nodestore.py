@@ -0,0 +1,79 @@
+"""
+Tests of Nodestore on trees grown by searches.
+"""
+import random
+import pytest
+from gamestate import Gamestate
+from rave_mctsagent import RaveMctsagent
+
+def searched_tree(transpositions, size=7, seconds=0.5):
+  """Return the tree of a search of an empty board."""
+  random.seed(size)
+  agent = RaveMctsagent(Gamestate(size))
+  agent.TRANSPOSITIONS = transpositions
+  agent.EARLY_STOP = False
+  agent.search(seconds)
+  return agent.tree
+
+def check_subtree(old, old_node, new, new_node, index, min_visits=0):
+  """
+  Assert that node old_node of the Nodestore old was kept as new_node of its
+  compacted copy new, mapped by index, with the same statistics, outcome and
+  children, and the same for the nodes below it. Nodes visited fewer than
+  min_visits times must have lost their children. Return the number of
+  nodes checked, counting a node once for every path to it.
+  """
+  assert index[old_node] == new_node
+  for name in ("N", "Q", "N_RAVE", "Q_RAVE", "num_moves", "outcome"):
+    assert getattr(old, name)[old_node] == getattr(new, name)[new_node], name
+  old_moves, old_children = old.children(old_node)
+  new_moves, new_children = new.children(new_node)
+  if new_node != 0 and old.N[old_node] < min_visits:
+    assert len(new_moves) == 0
+    return 1
+  assert sorted(old_moves.tolist()) == sorted(new_moves.tolist())
+  kept = dict(zip(new_moves.tolist(), new_children.tolist()))
+  return 1 + sum(check_subtree(old, child, new, kept[move], index,
+                               min_visits)
+                 for move, child in zip(old_moves.tolist(),
+                                        old_children.tolist()))
+
+@pytest.mark.parametrize("transpositions", [False, True])
+def test_compact_keeps_subtree(transpositions):
+  """Compacting on a root child keeps its subtree exactly."""
+  tree = searched_tree(transpositions)
+  moves, children = tree.children(0)
+  root = int(children[tree.N[children].argmax()])
+  new, index = tree.compact(root)
+  assert check_subtree(tree, root, new, 0, index) > 1
+  assert len(new) == (index >= 0).sum()
+
+@pytest.mark.parametrize("transpositions", [False, True])
+def test_compact_drops_rarely_visited(transpositions):
+  """
+  Compacting with min_visits keeps the nodes visited fewer times as leaves
+  and drops the nodes only they lead to.
+  """
+  tree = searched_tree(transpositions)
+  full, index = tree.compact(0)
+  new, index = tree.compact(0, 4)
+  assert check_subtree(tree, 0, new, 0, index, 4) > 1
+  assert len(new) < len(full)
+
+@pytest.mark.parametrize("prune", [False, True])
+def test_node_budget(prune):
+  """
+  A search stays within its node budget, by pruning or by no longer
+  expanding, and the root is expanded even if its children exceed it.
+  """
+  for budget in (20, 2000):
+    random.seed(budget)
+    agent = RaveMctsagent(Gamestate(9))
+    agent.PRUNE_TREE = prune
+    agent.EARLY_STOP = False
+    agent.set_node_budget(budget)
+    agent.search(0.5)
+    assert agent.tree.num_children[0] == 81
+    if budget > 81:
+      assert agent.peak_nodes <= budget
+    agent.best_move()
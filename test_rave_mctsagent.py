@@ -0,0 +1,60 @@
+"""
+Tests of the MCTS-Solver of RaveMctsagent against minimax.
+"""
+import random
+import pytest
+from gamestate import Gamestate
+from rave_mctsagent import RaveMctsagent
+from dca_mctsagent import DCAMctsagent
+from testutil import open_positions, minimax
+
+def proven_nodes(agent, state, node=0):
+  """
+  Yield the hash, the player to move and the outcome of every proven node
+  at or below node of the agent's tree, whose position is state.
+  """
+  tree = agent.tree
+  if tree.outcome[node] != Gamestate.PLAYERS["none"]:
+    yield state.hash, state.turn(), int(tree.outcome[node])
+  moves, children = tree.children(node)
+  for move, child in zip(moves.tolist(), children.tolist()):
+    state.play(state.tables.cells[move])
+    yield from proven_nodes(agent, state, child)
+    state.undo()
+
+@pytest.mark.parametrize("agent_class, settings", [
+  (RaveMctsagent, {}),
+  (RaveMctsagent, {"TRANSPOSITIONS": True}),
+  (RaveMctsagent, {"PROGRESSIVE_WIDENING": True}),
+  (RaveMctsagent, {"THREADS": 4}),
+  (DCAMctsagent, {})])
+def test_solver_agrees_with_minimax(agent_class, settings):
+  """
+  Every node proven on random 4x4 positions has the winner found by
+  minimax, both after a search and after a move that keeps its subtree.
+  """
+  positions = open_positions(4, 9, 5)
+  table = {}
+  for state in positions:
+    minimax(state.clone(), table)
+  checked = 0
+  for seed, state in enumerate(positions):
+    random.seed(seed)
+    agent = agent_class(state)
+    agent.SOLVER = True
+    agent.EARLY_STOP = False
+    for setting, value in settings.items():
+      setattr(agent, setting, value)
+    state = state.clone()
+    for step in range(2):
+      agent.search(0.3)
+      for key, turn, outcome in proven_nodes(agent, state.clone()):
+        winner = turn if table[key] > 0 else Gamestate.OPPONENT[turn]
+        assert outcome == winner
+        checked += 1
+      if state.winner() != Gamestate.PLAYERS["none"]:
+        break
+      move = agent.best_move()
+      agent.move(move)
+      state.play(move)
+  assert checked > 0
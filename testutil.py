@@ -0,0 +1,48 @@
+"""
+Random positions and an exhaustive search of them shared by the tests.
+"""
+import random
+from gamestate import Gamestate
+
+def open_positions(size, empty, count, seed=0):
+  """
+  Return count random positions with empty cells left that are not over,
+  every stone played where it does not lose at once.
+  """
+  rng = random.Random(seed)
+  positions = []
+  while len(positions) < count:
+    state = Gamestate(size)
+    while len(state.empty) > empty:
+      cells = [cell for cell in state.moves()
+               if not state.would_lose(cell, state.turn())]
+      if not cells:
+        break
+      state.play(rng.choice(cells))
+    if len(state.empty) == empty:
+      positions.append(state)
+  return positions
+
+def minimax(state, table):
+  """
+  Return the exact score of state by trying every move to the end of the
+  game, scored as by Endgamesolver, with table holding the scores of the
+  positions already seen by their hash.
+  """
+  score = table.get(state.hash)
+  if score is not None:
+    return score
+  winner = state.winner()
+  if winner != Gamestate.PLAYERS["none"]:
+    score = len(state.empty) + 1
+    if winner != state.turn():
+      score = -score
+  else:
+    score = -len(state.empty) - 1
+    for cell in state.moves():
+      state.play(cell)
+      score = max(score, -minimax(state, table))
+      state.undo()
+  table[state.hash] = score
+  return score
+
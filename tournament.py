@@ -44,5 +44,8 @@ for i in range(20):
   print (score1)
   print (score2)
   print (i)
+  print ("saved time")
+  print (basic.saved_time)
+  print (improved.saved_time)
   print (black.gtp_show("")[1])
   black, white = white, black
\ No newline at end of file
@@ -1,80 +1,116 @@
+from array import array
+
 class Unionfind:
   """
   Unionfind data structure specialized for finding hex connections.
   Implementation inspired by UAlberta CMPUT 275 2015 class notes.
+  Elements are the integers 0 to num_elements - 1, for a hex board these are
+  the cells x * size + y followed by two sentinels for the edges.
   """
-  
-  def __init__(self):
+
+  def __init__(self, num_elements):
     """
-    Initialize parent and rank as empty dictionarys, we will
-    lazily add items as nessesary.
+    Initialize parent, rank and next as preallocated arrays where every
+    element starts in a group of its own.
+    The groups are kept as circular linked lists through next so that they
+    can be merged and split again without building any lists.
     """
-    self.parent = {}
-    self.rank = {}
-    self.groups = {}
+    self.parent = array('i', range(num_elements))
+    self.rank = array('i', bytes(4 * num_elements))
+    self.next = array('i', range(num_elements))
     self.ignored = []
+    self.history = []
+
+  def clone(self):
+    """Return an independent copy of this structure."""
+    uf = Unionfind.__new__(Unionfind)
+    uf.parent = self.parent[:]
+    uf.rank = self.rank[:]
+    uf.next = self.next[:]
+    uf.ignored = self.ignored
+    uf.history = self.history[:]
+    return uf
 
   def join(self, x, y):
     """
     Merge the groups of x and y if they were not already,
-    return False if they were already merged, true otherwise
+    return False if they were already merged, true otherwise.
+    Every merge is recorded in the history so that it can be rolled back.
     """
     rep_x = self.find(x)
     rep_y = self.find(y)
 
     if rep_x == rep_y:
       return False
-    if self.rank[rep_x] < self.rank[rep_y]:
-      self.parent[rep_x] = rep_y
-      
-      self.groups[rep_y].extend(self.groups[rep_x])
-      del self.groups[rep_x]
-    elif self.rank[rep_x] >self.rank[rep_y]:
-      self.parent[rep_y] = rep_x
-      
-      self.groups[rep_x].extend(self.groups[rep_y])
-      del self.groups[rep_y]      
-    else:
-      self.parent[rep_x] = rep_y
-      self.rank[rep_y] += 1
-      
-      self.groups[rep_y].extend(self.groups[rep_x])
-      del self.groups[rep_x]  
-    
+    rank = self.rank
+    if rank[rep_x] > rank[rep_y]:
+      rep_x, rep_y = rep_y, rep_x
+    bumped = rank[rep_x] == rank[rep_y]
+
+    self.history.append((rep_x, rep_y, bumped))
+    self.parent[rep_x] = rep_y
+    if bumped:
+      rank[rep_y] += 1
+    # swapping the successors of two elements of different circular lists
+    # splices the lists together, swapping them back splits them again
+    nxt = self.next
+    nxt[rep_x], nxt[rep_y] = nxt[rep_y], nxt[rep_x]
+
     return True
 
   def find(self, x):
     """
     Get the representative element associated with the set in
-    which element x resides. Uses grandparent compression to compression
-    the tree on each find operation so that future find operations are faster.
+    which element x resides. The trees are kept shallow by union by rank
+    alone, no path compression is done so that joins stay reversible.
     """
-    if x not in self.parent:
-      self.parent[x] = x
-      self.rank[x] = 0
-      if x in self.ignored:
-        self.groups[x] = []
-      else:
-        self.groups[x] = [x]
-
-    px = self.parent[x]
-    if x == px: return x
-
-    gx = self.parent[px]
-    if gx==px: return px
-
-    self.parent[x] = gx
-
-    return self.find(gx)
+    parent = self.parent
+    px = parent[x]
+    while x != px:
+      x = px
+      px = parent[x]
+    return x
 
   def connected(self, x, y):
     """Check if two elements are in the same group."""
     return self.find(x)==self.find(y)
-  
+
+  def snapshot(self):
+    """Return a marker for the current state to pass to rollback."""
+    return len(self.history)
+
+  def rollback(self, snapshot):
+    """Undo every join made since snapshot was taken, most recent first."""
+    parent = self.parent
+    rank = self.rank
+    nxt = self.next
+    for child, rep, bumped in reversed(self.history[snapshot:]):
+      parent[child] = child
+      if bumped:
+        rank[rep] -= 1
+      nxt[child], nxt[rep] = nxt[rep], nxt[child]
+    del self.history[snapshot:]
+
   def set_ignored_elements(self, ignore):
     """Set elements in ignored."""
     self.ignored = ignore
-  
+
   def get_groups(self):
-    """Return dictionary of groups of connected cells."""
-    return self.groups
+    """
+    Return dictionary of groups of connected elements keyed by representative,
+    elements that were never joined to anything are left out.
+    """
+    groups = {}
+    for rep in range(len(self.parent)):
+      if self.parent[rep] != rep or self.next[rep] == rep:
+        continue
+      members = []
+      x = rep
+      while True:
+        if x not in self.ignored:
+          members.append(x)
+        x = self.next[x]
+        if x == rep:
+          break
+      groups[rep] = members
+    return groups